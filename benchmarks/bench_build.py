@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Benchmark building synthetic blogs of increasing size.
+
+For each combination of the number of posts, tags and categories a
+synthetic Sphinx project is generated and built with the html
+builder. Each build is done in a fresh interpreter, which builds the
+project in-process, so that the peak memory is measured for that
+build only. After the full build, one post is changed and the
+project is built again to measure an incremental build.
+
+For each build we report the wall time of the phases:
+
+* ``setup``: creating the Sphinx application.
+* ``read``: reading all outdated documents.
+* ``index``: the env-updated event, building the post index.
+* ``write``: resolving and writing the documents, including
+  ``process_blog_posts``, ``update_node_replace`` and the template
+  visitors.
+* ``resolve``: the part of ``write`` spent in doctree-resolved.
+* ``finish``: the build-finished event (feeds etc.).
+
+together with the peak memory (maximum resident set size), the size
+of the pickled environment and the size of the output. With
+``--instrument``, the report of the ``blog_instrumentation`` of the
+full build is included as well.
+
+The sidebars are disabled in the generated projects. Otherwise, each
+page would contain the full toctree of the blog, and the time spent
+by Sphinx rendering it would dominate the measurements.
+
+Usage::
+
+    python benchmarks/bench_build.py --posts 100 1000 --tags 10 200 \\
+        --categories 5 --output results.json
+
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+CONF = '''
+project = 'Benchmark'
+extensions = ['blogpost']
+html_theme = 'alabaster'
+html_sidebars = {{'**': []}}
+html_baseurl = 'https://example.org/'
+blog_feeds = {feeds}
+blog_instrumentation = {instrument}
+'''
+
+INDEX = '''Benchmark
+=========
+
+.. blog-post-recent::
+   :length: 10
+
+.. blog-post-list-tags::
+
+.. toctree::
+   :glob:
+
+   posts/*
+'''
+
+LISTING = '''{title}
+{line}
+
+.. {directive}::
+{options}'''
+
+POST = '''{title}
+{line}
+
+.. blog-post::
+   :author: Author {author}
+   :title: {title}
+   :category: {category}
+   :tags: {tags}
+   :time: {time}
+   :summary: {summary}
+
+Some text for {title}.
+
+'''
+
+START = datetime.datetime(2010, 1, 1, 12, 0, 0)
+
+
+def make_project(path, posts, tags, categories, posts_per_doc=1,
+                 page_size=None, feeds=False, instrument=False, seed=0):
+    """Write a synthetic blog project.
+
+    Parameters
+    ----------
+    path : string
+        The directory to create the project in.
+    posts : integer
+        The number of ``blog-post`` directives.
+    tags : integer
+        The number of different tags. Each post gets one to three.
+    categories : integer
+        The number of different categories.
+    posts_per_doc : integer, optional
+        The number of posts in each document.
+    page_size : integer, optional
+        The page size for the lists of tags, categories and the
+        archive. If not given, the lists are not paginated.
+    feeds : boolean, optional
+        If True, the feeds are written.
+    instrument : boolean, optional
+        If True, the instrumentation of the extension is turned on.
+    seed : integer, optional
+        Seed for selecting the tags and categories.
+
+    """
+    rand = random.Random(seed)
+    postdir = os.path.join(path, 'posts')
+    os.makedirs(postdir)
+    with open(os.path.join(path, 'conf.py'), 'w') as output:
+        output.write(CONF.format(feeds=feeds, instrument=instrument))
+    with open(os.path.join(path, 'index.rst'), 'w') as output:
+        output.write(INDEX)
+    options = ''
+    if page_size:
+        options = '   :page-size: {}\n'.format(page_size)
+    for name, title, directive in (
+            ('tags', 'Tags', 'blog-post-tags'),
+            ('categories', 'Categories', 'blog-post-categories'),
+            ('archive', 'Archive', 'blog-post-archive'),
+    ):
+        with open(os.path.join(postdir, name + '.rst'), 'w') as output:
+            output.write(
+                LISTING.format(title=title, line='=' * len(title),
+                               directive=directive, options=options)
+            )
+    tag_names = ['tag{}'.format(i) for i in range(tags)]
+    number = 0
+    for doc in range((posts + posts_per_doc - 1) // posts_per_doc):
+        filename = os.path.join(postdir, 'p{:06d}.rst'.format(doc))
+        with open(filename, 'w') as output:
+            for _ in range(min(posts_per_doc, posts - number)):
+                title = 'Post {}'.format(number)
+                post_time = START + datetime.timedelta(hours=7 * number)
+                output.write(
+                    POST.format(
+                        title=title,
+                        line='=' * len(title),
+                        author=number % 7,
+                        category='Category {}'.format(
+                            rand.randrange(categories)
+                        ),
+                        tags=', '.join(
+                            rand.sample(tag_names,
+                                        min(tags, rand.randint(1, 3)))
+                        ),
+                        time=post_time.strftime('%d.%m.%Y, %H:%M:%S'),
+                        summary='A summary of {}. '.format(title) * 5,
+                    )
+                )
+                number += 1
+
+
+def directory_size(path):
+    """Return the number of files and bytes in a directory."""
+    files, size = 0, 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            files += 1
+            size += os.path.getsize(os.path.join(dirpath, filename))
+    return files, size
+
+
+class PhaseTimer:
+    """Record the time of the build phases using the Sphinx events.
+
+    The handlers are connected with priorities before and after the
+    handlers of the extension, which use the default priority.
+    """
+
+    def __init__(self):
+        """Set up empty timings."""
+        self.marks = {}
+        self.resolve = 0.0
+        self._resolve_start = None
+
+    def mark(self, name):
+        """Return an event handler recording the time for `name`."""
+        def handler(*args):
+            """Record the time."""
+            # pylint: disable=unused-argument
+            self.marks[name] = time.perf_counter()
+        return handler
+
+    def start_resolve(self, *args):
+        """Record the start of doctree-resolved."""
+        # pylint: disable=unused-argument
+        self._resolve_start = time.perf_counter()
+
+    def end_resolve(self, *args):
+        """Record the end of doctree-resolved."""
+        # pylint: disable=unused-argument
+        self.resolve += time.perf_counter() - self._resolve_start
+
+    def connect(self, app):
+        """Connect the handlers to the application."""
+        app.connect('env-before-read-docs', self.mark('read'), priority=0)
+        app.connect('env-updated', self.mark('index'), priority=0)
+        app.connect('env-updated', self.mark('write'), priority=1000)
+        app.connect('doctree-resolved', self.start_resolve, priority=0)
+        app.connect('doctree-resolved', self.end_resolve, priority=1000)
+        app.connect('build-finished', self.mark('finish'), priority=0)
+        app.connect('build-finished', self.mark('end'), priority=1000)
+
+    def phases(self):
+        """Return the wall time of each phase, in seconds."""
+        order = ('read', 'index', 'write', 'finish', 'end')
+        phases = {}
+        for start, end in zip(order, order[1:]):
+            if start in self.marks and end in self.marks:
+                phases[start] = self.marks[end] - self.marks[start]
+        phases['resolve'] = self.resolve
+        return phases
+
+
+def build(srcdir, outdir, doctreedir, jobs=1):
+    """Build a project in-process and return the timings."""
+    # pylint: disable=import-outside-toplevel
+    from sphinx.application import Sphinx
+    from sphinx.util.docutils import docutils_namespace
+    with docutils_namespace():
+        start = time.perf_counter()
+        app = Sphinx(srcdir, srcdir, outdir, doctreedir, 'html',
+                     status=None, warning=sys.stderr, parallel=jobs)
+        timer = PhaseTimer()
+        timer.connect(app)
+        phases = {'setup': time.perf_counter() - start}
+        app.build()
+        phases.update(timer.phases())
+        phases['total'] = time.perf_counter() - start
+    return phases
+
+
+def run_case(case):
+    """Generate and build a project, called in the fresh interpreter."""
+    with tempfile.TemporaryDirectory(prefix='blogbench-') as tmp:
+        srcdir = os.path.join(tmp, 'src')
+        outdir = os.path.join(tmp, 'out')
+        doctreedir = os.path.join(tmp, 'doctrees')
+        make_project(srcdir, case['posts'], case['tags'],
+                     case['categories'],
+                     posts_per_doc=case['posts_per_doc'],
+                     page_size=case['page_size'], feeds=case['feeds'],
+                     instrument=case['instrument'])
+        result = dict(case)
+        result['full'] = build(srcdir, outdir, doctreedir,
+                               jobs=case['jobs'])
+        result['pickle_bytes'] = os.path.getsize(
+            os.path.join(doctreedir, 'environment.pickle')
+        )
+        result['output_files'], result['output_bytes'] = directory_size(
+            outdir
+        )
+        report = os.path.join(doctreedir, 'blogpost-report.json')
+        if case['instrument']:
+            with open(report) as infile:
+                result['instrumentation'] = json.load(infile)
+        changed = os.path.join(srcdir, 'posts', 'p000000.rst')
+        with open(changed, 'a') as output:
+            output.write('\nSome more text.\n')
+        result['incremental'] = build(srcdir, outdir, doctreedir,
+                                      jobs=case['jobs'])
+        result['peak_rss_kib'] = resource.getrusage(
+            resource.RUSAGE_SELF
+        ).ru_maxrss
+    return result
+
+
+def run_child(case):
+    """Run a case in a fresh interpreter and return its results."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [i for i in env.get('PYTHONPATH', '').split(os.pathsep) if i]
+    )
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--case',
+         json.dumps(case)],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        env=env,
+    )
+    return json.loads(out.stdout)
+
+
+def main():
+    """Run the benchmark and print the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--posts', type=int, nargs='+',
+                        default=[100, 1000, 10000, 50000],
+                        help='Numbers of posts to benchmark.')
+    parser.add_argument('--tags', type=int, nargs='+', default=[20],
+                        help='Numbers of different tags.')
+    parser.add_argument('--categories', type=int, nargs='+', default=[5],
+                        help='Numbers of different categories.')
+    parser.add_argument('--posts-per-doc', type=int, default=1,
+                        help='Number of posts in each document.')
+    parser.add_argument('--page-size', type=int, default=None,
+                        help='Page size for the listings.')
+    parser.add_argument('--feeds', action='store_true',
+                        help='Also write the feeds.')
+    parser.add_argument('--instrument', action='store_true',
+                        help='Include the instrumentation of the extension.')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of parallel Sphinx processes.')
+    parser.add_argument('--output', default=None,
+                        help='Write the results to this file.')
+    parser.add_argument('--case', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.case is not None:
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+    # pylint: disable=import-outside-toplevel
+    import sphinx
+    results = {
+        'python': sys.version.split()[0],
+        'sphinx': sphinx.__version__,
+        'cases': [],
+    }
+    for posts, tags, categories in itertools.product(
+            args.posts, args.tags, args.categories
+    ):
+        case = {
+            'posts': posts,
+            'tags': tags,
+            'categories': categories,
+            'posts_per_doc': args.posts_per_doc,
+            'page_size': args.page_size,
+            'feeds': args.feeds,
+            'instrument': args.instrument,
+            'jobs': args.jobs,
+        }
+        print('Building {posts} posts, {tags} tags, {categories} '
+              'categories...'.format(**case), file=sys.stderr)
+        results['cases'].append(run_child(case))
+    text = json.dumps(results, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
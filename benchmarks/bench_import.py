@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Benchmark the time needed for importing the extension.
+
+Each measurement is done in a fresh interpreter. We measure the
+time for ``import blogpost`` and, separately, the time for
+importing jinja2 and compiling all templates. The latter was
+part of the import time before the templates were made lazy, and
+is now only spent by builders that render the blog nodes.
+
+Usage::
+
+    python benchmarks/bench_import.py --repeat 20
+
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+IMPORT_CODE = '''
+import sys, time
+start = time.perf_counter()
+import blogpost
+end = time.perf_counter()
+print(end - start, 'jinja2' in sys.modules)
+'''
+
+COMPILE_CODE = '''
+import time
+import blogpost.templatehandler as handler
+start = time.perf_counter()
+for name, files in handler.TEMPLATE_FILES.items():
+    for key in files:
+        handler.get_template(name, key=key)
+end = time.perf_counter()
+print(end - start, True)
+'''
+
+
+def run_python(code):
+    """Run code in a fresh interpreter and return the time it reports."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [i for i in env.get('PYTHONPATH', '').split(os.pathsep) if i]
+    )
+    out = subprocess.run(
+        [sys.executable, '-c', code],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        env=env,
+    )
+    seconds, jinja = out.stdout.split()
+    return float(seconds), jinja == 'True'
+
+
+def measure(code, repeat):
+    """Return statistics for running the given code several times."""
+    times = []
+    jinja = False
+    for _ in range(repeat):
+        seconds, jinja = run_python(code)
+        times.append(seconds)
+    return {
+        'median_ms': 1000 * statistics.median(times),
+        'min_ms': 1000 * min(times),
+        'jinja2_imported': jinja,
+    }
+
+
+def main():
+    """Run the benchmark and print the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='Number of fresh interpreters per measurement.')
+    args = parser.parse_args()
+    results = {
+        'import blogpost': measure(IMPORT_CODE, args.repeat),
+        'compile templates': measure(COMPILE_CODE, args.repeat),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,11 @@
 # Distributed under the LGPLv2.1+ License. See LICENSE for more info.
 """An extension for sphinx for making a blog-like web page."""
 import os
+import posixpath
 from docutils import nodes
+from sphinx.util import logging
+from sphinx.util.osutil import relative_uri
 from blogpost.blogpostdirective import (
-    shorten_text,
     BlogNode,
     BlogOutputNode,
     CategoryNode,
@@ -13,14 +15,26 @@ from blogpost.blogpostdirective import (
     TagListNode,
     ArchiveNode,
     RecentNode,
+    PaginationNode,
+    ListingNode,
+    PostIndexNode,
     BlogPostDirective,
     BlogCategoryDirective,
     BlogTagDirective,
     BlogTagListDirective,
     BlogArchiveDirective,
     BlogRecentDirective,
+    BlogPostIndexDirective,
 )
 from blogpost.templatehandler import (
+    init_templates,
+    template_path,
+    render_template,
+    render_blogoutput,
+    short_summary,
+    html_visit_listing,
+    html_visit_pagination,
+    html_depart_pagination,
     html_visit_empty,
     html_depart_empty,
     html_visit_taglist,
@@ -31,10 +45,87 @@ from blogpost.templatehandler import (
     html_depart_blogpost,
     html_visit_blogoutput,
     html_depart_blogoutput,
+    html_visit_postindex,
+    html_depart_postindex,
 )
+from blogpost.assets import (
+    ASSETS,
+    CRITICAL_TEMPLATES,
+    build_asset,
+    critical_css,
+    minify_css,
+    minify_js,
+    template_classes,
+)
+from blogpost.fileutils import update_file
+from blogpost.instrument import STATS, count_nodes, timed
+from blogpost.jsonindex import MANIFEST, write_index
+from blogpost.pagination import paginate, first_pages, page_name
+from blogpost.postindex import PostIndex, post_key
+from blogpost.related import affected_posts, related_posts
+from blogpost.thumbnails import THUMBNAIL_DIR, ThumbnailCache, has_pillow
+from blogpost.uricache import RelativeUriCache
+
+
+BLOG_NODES = (
+    BlogNode,
+    CategoryNode,
+    TagNode,
+    TagListNode,
+    ArchiveNode,
+    RecentNode,
+    PostIndexNode,
+)
+
+
+LOGGER = logging.getLogger(__name__)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'static')
+
+
+LISTING_DOCNAMES = (
+    'category_docname',
+    'tag_docname',
+    'archive_docname',
+)
+
+
+COMPRESSED_SUFFIXES = ('.gz', '.br', '.tmp')
+
+
+LISTING_DOCNAME_SETS = (
+    'taglist_docnames',
+    'recent_docnames',
+)
+
+
+def get_relative_uri(app, fromdocname, todocname):
+    """Return the relative URI from one document to another.
+
+    The URIs are memoized in ``env.blog_uri_cache`` since the same
+    references are requested for many of the documents.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    fromdocname : string
+        The document to create the reference from.
+    todocname : string
+        The document to create the reference to.
+
+    Returns
+    -------
+    out : string
+        The relative URI.
+
+    """
+    env = app.builder.env
+    STATS.count('get_relative_uri')
+    return env.blog_uri_cache.get(app.builder, fromdocname, todocname)
 
 
-def make_references(app, fromdocname):
+def make_references(app, fromdocname, posts):
     """Build references to posts from a given document.
 
     Parameters
@@ -43,169 +134,593 @@ def make_references(app, fromdocname):
         The application object used.
     fromdocname : string
         The document to create references from.
+    posts : list of objects like :py:class:`.PostRecord`
+        The posts to create references to.
 
     Returns
     -------
-    out : list of objects like :py:class:`docutils.nodes.reference`
-        These nodes give the references to the posts from the
+    out : list of strings
+        These strings give the references to the posts from the
         given document name.
 
     """
-    env = app.builder.env
     references = []
-    for post_info in env.all_posts:
-        post_node = post_info['post_node']
-        newnode = nodes.reference(post_node['title'], post_node['title'])
-        newnode['refuri'] = app.builder.get_relative_uri(
-            fromdocname, post_info['docname'])
-        newnode['refuri'] += '#' + post_info['targetnode']['refid']
-        references.append(newnode)
+    for post in posts:
+        refuri = get_relative_uri(app, fromdocname, post.docname)
+        refuri += '#' + post.targetid
+        references.append(refuri)
     return references
 
 
-def build_category_info(app, fromdocname):
-    """Build info about categories.
+def build_item_list(app, fromdocname, posts):
+    """Build info about the posts in a group.
 
     Parameters
     ----------
     app : object like :py:class:`sphinx.application.Sphinx`
         The application object used.
     fromdocname : string
-        The document where the categories will be listed.
+        The document where the posts will be listed.
+    posts : list of objects like :py:class:`.PostRecord`
+        The posts in the group.
 
     Returns
     -------
-    out : dict of list of dicts
-        For each category, this dict contains a list of posts
-        labeled with the category. Each post is represented with
-        a dict.
+    out : list of dicts
+        Each post is represented with a dict.
 
     """
-    env = app.builder.env
-    categories = {}
-    references = make_references(app, fromdocname)
-    for post_info, refnode in zip(env.all_posts, references):
-        post_node = post_info['post_node']
-        cat = post_node['category']
-        if cat not in categories:
-            categories[cat] = []
-        categories[cat].append(
-            {
-                'time': post_info['time'],
-                'refnode': refnode,
-                'post_node': post_node,
-            }
-        )
-    # sort items in categories on time:
-    for cat, items in categories.items():
-        categories[cat] = sorted(items, key=lambda x: x['time'], reverse=True)
+    references = make_references(app, fromdocname, posts)
+    return [
+        {
+            'time': post.time,
+            'refuri': refuri,
+            'post': post,
+        } for post, refuri in zip(posts, references)
+    ]
 
-    if not hasattr(env, 'category_id'):
-        env.category_id = {}
-        for cat in sorted(categories):
-            cat_id = 'category-%d' % env.new_serialno('category')
-            env.category_id[cat] = cat_id
-    return categories
 
+@timed('build_post_index')
+def build_post_index(app, env):
+    """Build the index of the posts once all documents have been read.
 
-def build_tag_info(app, fromdocname):
-    """Build info about tags.
+    The index is stored as ``env.blog_index``. Here, we also set the
+    references for the categories, tags and years, which are derived
+    from their names (see :py:class:`.PostIndex`), and reset the
+    cache for relative URIs.
 
     Parameters
     ----------
     app : object like :py:class:`sphinx.application.Sphinx`
         The application object used.
-    fromdocname : string
-        The document where the tags will be listed.
+    env : object like :py:class:`sphinx.environment.BuildEnvironment`
+        The build environment.
 
     Returns
     -------
-    out : dict of list of dicts
-        For each tag, this dict contains a list of posts
-        labeled with the tag. Each post is represented with
-        a dict.
+    out : list of strings
+        The documents which must be written again since posts
+        were added, changed or removed: the listing pages, the
+        neighbours of the posts, the posts with new related posts
+        and the posts in categories or tags whose slugs changed.
 
     """
-    env = app.builder.env
-    tags = {}
-    references = make_references(app, fromdocname)
-    for post_info, refnode in zip(env.all_posts, references):
-        post_node = post_info['post_node']
-        for tag in post_node['tags']:
-            if tag not in tags:
-                tags[tag] = []
-            tags[tag].append(
-                {
-                    'time': post_info['time'],
-                    'refnode': refnode,
-                    'post_node': post_node,
-                }
+    old_index = getattr(env, 'blog_index', None)
+    index = PostIndex(stored_posts(env))
+    env.blog_index = index
+    env.blog_uri_cache = RelativeUriCache()
+    env.blog_thumbnails = None
+    env.blog_tocs = None
+    env.blog_extra_pages = set()
+    env.category_id = index.ids['category']
+    env.tag_id = index.ids['tag']
+    env.archive_id = index.ids['year']
+    previous = getattr(env, 'blog_previous', None)
+    read = getattr(env, 'blog_read_docnames', set())
+    env.blog_previous = None
+    env.blog_read_docnames = set()
+    if app.config.blog_metadata_db:
+        store_post_metadata(app, env, read)
+    outdated, changed = set(), []
+    if previous is not None:
+        outdated, changed = find_changed_posts(env, index, previous, read)
+        if old_index is not None:
+            outdated |= renamed_group_docnames(old_index, index)
+    outdated |= update_related_posts(app, env, index, changed,
+                                     full=previous is None)
+    return sorted(outdated & env.found_docs)
+
+
+def stored_posts(env):
+    """Return the posts of all documents, see ``env.blog_posts``."""
+    return [
+        post for posts in getattr(env, 'blog_posts', {}).values()
+        for post in posts
+    ]
+
+
+def post_states(posts):
+    """Return the values of the given posts, keyed on target id."""
+    return {post.targetid: post.__getstate__() for post in posts}
+
+
+def find_changed_posts(env, index, previous, read):
+    """Compare the posts of the documents read with their old versions.
+
+    A document which is read again does not necessarily have modified
+    posts, e.g. when only the text of a post was changed. The posts
+    are therefore compared on their values, and only if they differ,
+    the listing pages and the neighbours of the posts have to be
+    written again.
+
+    Parameters
+    ----------
+    env : object like :py:class:`sphinx.environment.BuildEnvironment`
+        The build environment.
+    index : object like :py:class:`.PostIndex`
+        The new index of the posts.
+    previous : dict of tuples
+        The old posts and their neighbours for the documents
+        changed or removed, as stored by
+        :py:func:`.get_outdated_posts`.
+    read : set of strings
+        The documents read in this build.
+
+    Returns
+    -------
+    outdated : set of strings
+        The documents which must be written again.
+    changed : list of objects like :py:class:`.PostRecord`
+        The old and new versions of the modified posts.
+
+    """
+    outdated = set()
+    changed = []
+    for docname in read | set(previous):
+        posts = getattr(env, 'blog_posts', {}).get(docname, [])
+        old_posts, old_neighbours = previous.get(docname, ([], set()))
+        if post_states(posts) != post_states(old_posts):
+            outdated |= listing_docnames(env)
+            outdated |= old_neighbours | index.neighbour_docnames(posts)
+            changed.extend(old_posts + posts)
+    return outdated, changed
+
+
+def renamed_group_docnames(old_index, index):
+    """Return the documents with posts in groups with a new slug.
+
+    The slug of a category or tag also depends on the other names
+    giving the same slug (see :py:func:`.unique_slugs`). Adding a
+    name may therefore change the slug, and the references, for
+    posts which are not changed themselves.
+
+    Parameters
+    ----------
+    old_index : object like :py:class:`.PostIndex`
+        The index from the previous build.
+    index : object like :py:class:`.PostIndex`
+        The new index.
+
+    Returns
+    -------
+    out : set of strings
+        The documents with posts in the renamed categories and tags.
+
+    """
+    docnames = set()
+    for kind, groups in (('category', index.categories),
+                         ('tag', index.tags)):
+        old_slugs = old_index.slugs[kind]
+        for key, slug in index.slugs[kind].items():
+            if old_slugs.get(key, slug) != slug:
+                docnames.update(post.docname for post in groups[key])
+    return docnames
+
+
+@timed('update_related_posts')
+def update_related_posts(app, env, index, changed, full=False):
+    """Find the related posts, for the posts affected by changes.
+
+    The related posts are stored in ``env.blog_related`` and
+    they are kept between builds. Only the posts sharing a tag or
+    the category with a changed post are scored again, see
+    :py:mod:`blogpost.related`.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    env : object like :py:class:`sphinx.environment.BuildEnvironment`
+        The build environment.
+    index : object like :py:class:`.PostIndex`
+        The index of the posts.
+    changed : list of objects like :py:class:`.PostRecord`
+        The posts added, modified or removed in this build.
+    full : boolean, optional
+        If True, the related posts are found for all posts.
+
+    Returns
+    -------
+    out : set of strings
+        The documents with posts whose related posts changed, or
+        which link to a changed post.
+
+    """
+    length = app.config.blog_related_posts
+    cache = getattr(env, 'blog_related', None)
+    if not length:
+        env.blog_related = None
+        return set()
+    if full or cache is None or cache['length'] != length:
+        env.blog_related = {
+            'length': length,
+            'related': related_posts(index, index.posts, length),
+        }
+        return set()
+    related = cache['related']
+    changed_keys = {post_key(post) for post in changed}
+    for key in changed_keys:
+        related.pop(key, None)
+    outdated = set()
+    scored = related_posts(index, affected_posts(index, changed), length)
+    for key, others in scored.items():
+        if related.get(key) != others:
+            outdated.add(key[0])
+        related[key] = others
+    for key, others in related.items():
+        if changed_keys.intersection(others):
+            outdated.add(key[0])
+    STATS.count('related_posts_scored', len(scored))
+    return outdated
+
+
+def related_refs(app, env, node):
+    """Return the titles of and references to the related posts.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    env : object like :py:class:`sphinx.environment.BuildEnvironment`
+        The build environment.
+    node : object like :py:class:`.BlogNode`
+        The post to find the related posts for.
+
+    Returns
+    -------
+    out : list of dicts
+        The `title` and `ref` of each related post.
+
+    """
+    if not getattr(env, 'blog_related', None):
+        return []
+    index = env.blog_index
+    items = []
+    for key in env.blog_related['related'].get(
+            (node['docname'], node['targetid']), ()
+    ):
+        post = index.posts[index.position[key]]
+        refuri = get_relative_uri(app, node['docname'], post.docname)
+        items.append({'title': post.title,
+                      'ref': refuri + '#' + post.targetid})
+    return items
+
+
+def open_metadata_db(app):
+    """Open the database with the metadata of the posts.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+
+    Returns
+    -------
+    out : object like :py:class:`.PostDatabase`
+        The database, or None if it could not be opened.
+
+    """
+    # pylint: disable=import-outside-toplevel
+    import sqlite3
+    from blogpost.metadb import DATABASE, PostDatabase
+    try:
+        return PostDatabase(os.path.join(app.doctreedir, DATABASE))
+    except sqlite3.Error as error:
+        LOGGER.warning('Could not open the post database: %s', error)
+        return None
+
+
+@timed('store_post_metadata')
+def store_post_metadata(app, env, docnames):
+    """Store the posts in the database in the build directory.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    env : object like :py:class:`sphinx.environment.BuildEnvironment`
+        The build environment.
+    docnames : set of strings
+        The documents read in this build.
+
+    """
+    # pylint: disable=import-outside-toplevel
+    import sqlite3
+    from blogpost.metadb import DATABASE
+    database = open_metadata_db(app)
+    if database is None:
+        return
+    sources = {
+        docname: os.fspath(env.doc2path(docname))
+        for docname in env.found_docs
+    }
+    try:
+        updated = database.update(app.srcdir, sources, env.blog_index.posts,
+                                  docnames)
+    except sqlite3.Error as error:
+        LOGGER.warning('Could not update the post database: %s', error)
+        return
+    finally:
+        database.close()
+    LOGGER.verbose('blogpost: stored the posts of %d documents in %s',
+                   updated, DATABASE)
+
+
+def listing_docnames(env):
+    """Return the documents listing posts from all documents."""
+    docnames = set()
+    for key in LISTING_DOCNAME_SETS:
+        docnames.update(getattr(env, key, ()))
+    for key in LISTING_DOCNAMES:
+        if hasattr(env, key):
+            docnames.add(getattr(env, key))
+    return docnames
+
+
+def purge_blog_posts(app, env, docname):
+    """Remove the posts and listings stored for a document.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    env : object like :py:class:`sphinx.environment.BuildEnvironment`
+        The build environment.
+    docname : string
+        The document to remove information for.
+
+    """
+    # pylint: disable=unused-argument
+    if hasattr(env, 'blog_posts'):
+        env.blog_posts.pop(docname, None)
+    for key in LISTING_DOCNAMES:
+        if getattr(env, key, None) == docname:
+            delattr(env, key)
+    for key in LISTING_DOCNAME_SETS:
+        if hasattr(env, key):
+            getattr(env, key).discard(docname)
+    if hasattr(env, 'blog_page_size'):
+        env.blog_page_size.pop(docname, None)
+
+
+def get_outdated_posts(app, env, added, changed, removed):
+    """Find the documents affected by changed or removed posts.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    env : object like :py:class:`sphinx.environment.BuildEnvironment`
+        The build environment, as it was after the previous build.
+    added : set of strings
+        The documents added since the previous build.
+    changed : set of strings
+        The documents changed since the previous build.
+    removed : set of strings
+        The documents removed since the previous build.
+
+    Returns
+    -------
+    out : list of strings
+        The documents to read again. This is always empty since
+        the affected documents only have to be written again.
+
+    Note
+    ----
+    For the changed and removed documents, the posts and their
+    neighbours are stored in ``env.blog_previous``, so that
+    :py:func:`.build_post_index` can check if the posts were
+    modified when the documents have been read.
+
+    """
+    # pylint: disable=unused-argument
+    env.blog_previous = None
+    index = getattr(env, 'blog_index', None)
+    if index is None:
+        return []
+    previous = {}
+    for docname in changed | removed:
+        posts = list(getattr(env, 'blog_posts', {}).get(docname, []))
+        previous[docname] = (posts, index.neighbour_docnames(posts))
+    env.blog_previous = previous
+    return []
+
+
+def note_read_docnames(app, env, docnames):
+    """Note the documents read in this build.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    env : object like :py:class:`sphinx.environment.BuildEnvironment`
+        The build environment.
+    docnames : list of strings
+        The documents that will be read.
+
+    """
+    # pylint: disable=unused-argument
+    env.blog_read_docnames = set(docnames)
+
+
+def merge_blog_posts(app, env, docnames, other):
+    """Merge the posts read by a parallel process.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    env : object like :py:class:`sphinx.environment.BuildEnvironment`
+        The build environment we are merging into.
+    docnames : set of strings
+        The documents read by the other process.
+    other : object like :py:class:`sphinx.environment.BuildEnvironment`
+        The build environment of the other process.
+
+    """
+    # pylint: disable=unused-argument
+    if not hasattr(env, 'blog_posts'):
+        env.blog_posts = {}
+    for docname, posts in getattr(other, 'blog_posts', {}).items():
+        if docname in docnames:
+            env.blog_posts[docname] = posts
+    for key in LISTING_DOCNAMES:
+        docname = getattr(other, key, None)
+        if docname not in docnames:
+            continue
+        if getattr(env, key, docname) != docname:
+            raise ValueError(
+                'Only one "{}" is supported!'.format(key)
             )
-    for tag, items in tags.items():
-        tags[tag] = sorted(items, key=lambda x: x['time'], reverse=True)
+        setattr(env, key, docname)
+    for key in LISTING_DOCNAME_SETS:
+        if not hasattr(env, key):
+            setattr(env, key, set())
+        getattr(env, key).update(
+            set(getattr(other, key, ())) & set(docnames)
+        )
+    if not hasattr(env, 'blog_page_size'):
+        env.blog_page_size = {}
+    for docname, page_size in getattr(other, 'blog_page_size', {}).items():
+        if docname in docnames:
+            env.blog_page_size[docname] = page_size
+
 
-    if not hasattr(env, 'tag_id'):
-        env.tag_id = {}
-        for tag in sorted(tags):
-            tag_id = 'tag-%d' % env.new_serialno('tag')
-            env.tag_id[tag] = tag_id
-    return tags
+def has_blog_nodes(doctree):
+    """Check if a document contains any nodes added by this extension."""
+    return doctree.next_node(
+        lambda node: isinstance(node, BLOG_NODES)
+    ) is not None
 
 
-def build_archive_info(app, fromdocname):
-    """Buld info about all posts.
+def listings(env):
+    """Yield the lists of categories, tags and the archive.
+
+    Parameters
+    ----------
+    env : object like :py:class:`sphinx.environment.BuildEnvironment`
+        The build environment.
+
+    Yields
+    ------
+    out : tuple
+        The document with the list, the grouped posts, the
+        references for the groups, True if the groups are
+        sorted in reverse and the heading used in the table
+        of contents.
+
+    """
+    index = env.blog_index
+    for key, groups, env_id, reverse, head in (
+            ('category_docname', index.categories, env.category_id, False,
+             'Categories'),
+            ('tag_docname', index.tags, env.tag_id, False, 'Tags'),
+            ('archive_docname', index.archive, env.archive_id, True,
+             'Archive'),
+    ):
+        if hasattr(env, key):
+            yield getattr(env, key), groups, env_id, reverse, head
+
+
+def group_title(key, groups):
+    """Return the title for a group of posts."""
+    return '{} ({})'.format(key, len(groups[key]))
+
+
+def group_refs(app, pagename, docname, keys, env_id, first, number):
+    """Return the references to the groups in a paginated listing.
 
     Parameters
     ----------
     app : object like :py:class:`sphinx.application.Sphinx`
         The application object used.
-    fromdocname : string
-        The document where the archive will be listed.
+    pagename : string
+        The page we are creating references from.
+    docname : string
+        The document containing the listing.
+    keys : list of strings
+        The groups to create references to.
+    env_id : dict of strings
+        The references for the groups.
+    first : dict of integers
+        The page where each group starts.
+    number : integer
+        The number of the page we are creating references from.
 
     Returns
     -------
-    out : dict of list of dicts
-        For each year, this dict contains a list of posts
-        from that year. Each post is represented with
-        a dict.
+    out : list of strings
+        The references, in the same order as `keys`.
 
     """
-    env = app.builder.env
-    archive = {}
-    archive_flat = []
-    references = make_references(app, fromdocname)
-    for post_info, refnode in zip(env.all_posts, references):
-        post_node = post_info['post_node']
-        year = post_node['year']
-        if year not in archive:
-            archive[year] = []
-        archive[year].append(
-            {
-                'time': post_info['time'],
-                'refnode': refnode,
-                'post_node': post_node,
-            }
+    refs = []
+    for key in keys:
+        ref = '#' + env_id[key]
+        if first[key] != number:
+            ref = get_relative_uri(
+                app, pagename, page_name(docname, first[key])
+            ) + ref
+        refs.append(ref)
+    return refs
+
+
+def page_refs(app, pagename, docname, number, npages):
+    """Return references to the previous and next page of a listing.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    pagename : string
+        The page we are creating references from.
+    docname : string
+        The document containing the listing.
+    number : integer
+        The number of the page we are creating references from.
+    npages : integer
+        The number of pages in the listing.
+
+    Returns
+    -------
+    out[0] : string or None
+        The reference to the previous page, if any.
+    out[1] : string or None
+        The reference to the next page, if any.
+
+    """
+    prev_ref, next_ref = None, None
+    if number > 0:
+        prev_ref = get_relative_uri(
+            app, pagename, page_name(docname, number - 1)
         )
-        archive_flat.append(
-            {
-                'time': post_info['time'],
-                'refnode': refnode,
-                'post_node': post_node,
-                'docname': post_info['docname'],
-            }
+    if number < npages - 1:
+        next_ref = get_relative_uri(
+            app, pagename, page_name(docname, number + 1)
         )
-    for year, items in archive.items():  # sort on time
-        archive[year] = sorted(items, key=lambda x: x['time'], reverse=True)
-    archive_flat = sorted(archive_flat, key=lambda x: x['time'], reverse=True)
-    if not hasattr(env, 'archive_id'):
-        env.archive_id = {}
-        for year in sorted(archive):
-            year_id = 'year-%d' % env.new_serialno('year')
-            env.archive_id[year] = year_id
-    return archive, archive_flat
-
-
-def make_new_section(key, item_dict, env_id):
+    return prev_ref, next_ref
+
+
+def make_new_section(key, groups, env_id, refuri=None):
     """Make a new section for a list of posts..
 
     The created section is used to show a list of post which
@@ -216,11 +731,13 @@ def make_new_section(key, item_dict, env_id):
     ----------
     key : string
         The name of the new section
-    item_dict : dict of list of dicts
-        This dictionary contains the items in this section.
-        Each post for a section is represented by a dict.
+    groups : dict of lists
+        This dictionary contains all the posts for each section.
     env_id : dict of strings
         The unique references associated with the given key.
+    refuri : string, optional
+        The page where the section starts. If not given, the
+        section is assumed to start in the current document.
 
     Returns
     -------
@@ -230,11 +747,10 @@ def make_new_section(key, item_dict, env_id):
         The contents of the section.
 
     """
-    titl = '{} ({})'.format(key, len(item_dict[key]))
+    titl = group_title(key, groups)
     section = nodes.section()
     section['ids'] = [env_id[key]]
     section['names'] = [env_id[key]]
-    section['blog'] = titl
     title = nodes.subtitle('', '')
     ref = nodes.reference(titl, titl)
     ref['refid'] = env_id[key]
@@ -243,7 +759,11 @@ def make_new_section(key, item_dict, env_id):
 
     par = nodes.paragraph()
     ref = nodes.reference(titl, titl)
-    ref['refid'] = env_id[key]
+    if refuri is None:
+        ref['refid'] = env_id[key]
+    else:
+        ref['refuri'] = refuri
+        ref['internal'] = True
     par += ref
     section_item = nodes.list_item()
     section_item += par
@@ -267,9 +787,9 @@ def make_item_list(item_list):
     item_bullet_list = nodes.bullet_list()
     for item in item_list:
         new_node = BlogOutputNode()
-        new_node['title'] = item['post_node']['title']
-        new_node['summary'] = item['post_node']['summary']
-        new_node['refid'] = item['refnode']['refuri']
+        new_node['title'] = item['post'].title
+        new_node['summary'] = item['post'].summary
+        new_node['refid'] = item['refuri']
         new_node['time'] = item['time']
         item_par = nodes.paragraph()
         item_par += new_node
@@ -279,23 +799,37 @@ def make_item_list(item_list):
     return item_bullet_list
 
 
-def update_node_replace(doctree, obj, item_dict, env_id, reverse=False):
+@timed('update_node_replace')
+def update_node_replace(app, doctree, fromdocname, obj, groups, env_id,
+                        reverse=False):
     """Update a node with contents so that it will be rendered.
 
     This method is meant for replacing the archive node, the
     list-of-tags node and the list-of-categories node. These nodes
-    will be replaced by other nodes which sphinx can handle.
+    will be replaced by other nodes which sphinx can handle. If the
+    list is paginated, only the first page is shown here, the other
+    pages are created by :py:func:`.collect_listing_pages`. These
+    pages only exist for HTML, other formats get the full list.
+
+    For HTML, the list is rendered with the ``listing`` template into
+    a single :py:class:`.ListingNode`, which gives the same output as
+    the other pages of the list. For other formats, the list is built from
+    docutils nodes.
 
     Parameters
     ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
     doctree : object like :py:class:`docutils.nodes.document`
         The document in which we will be updating the node.
+    fromdocname : string
+        The name of the document we are updating.
     obj : object
         This is the object class we will be looking for in the
         document.
-    item_dict : dict of list of dicts.
-        This dict contains the blog post, sorted on the keys and
-        on time in each list.
+    groups : dict of lists
+        This dict contains the blog posts, grouped on the keys and
+        sorted on time in each list.
     env_id : dict of strings
         These are the references for the categories/tags etc.
     reverse : boolean
@@ -303,182 +837,1051 @@ def update_node_replace(doctree, obj, item_dict, env_id, reverse=False):
 
     """
     for node in doctree.traverse(obj):
-        sections = []
-        section_list = nodes.bullet_list()
-        par_sections = nodes.paragraph()
-        for key in sorted(item_dict, reverse=reverse):
-            # For each key add title/section
-            section, section_item = make_new_section(key, item_dict, env_id)
-            sections.append(section)
-            section_list += section_item
-            # Collect content for this section:
-            section_content = make_item_list(item_dict[key])
-            par_sections += section
-            par_sections += section_content
-        par = nodes.paragraph()
-        par += section_list
-        content = [par, par_sections]
+        keys = sorted(groups, reverse=reverse)
+        pages = paginate(groups, keys, listing_page_size(app, node))
+        if app.builder.format == 'html':
+            content = [
+                make_raw_listing(app, fromdocname, pages, groups, env_id,
+                                 keys)
+            ]
+        else:
+            content = make_listing_nodes(app, fromdocname, pages, groups,
+                                         env_id, keys)
+        count_nodes(content)
         node.replace_self(content)
 
 
-def get_image_name(app, env, docname, node):
-    """Return the path to the summary image."""
-    imgdir = os.path.dirname(
-        app.builder.get_relative_uri(
-            env.recent_docname, docname
+def listing_page_size(app, node):
+    """Return the page size of a listing, or None if not paginated.
+
+    Only the HTML builders get the extra pages of the listings, see
+    :py:func:`.collect_listing_pages`, so for other formats the
+    listings are never paginated.
+    """
+    if app.builder.format != 'html':
+        return None
+    return node.get('page_size')
+
+
+def make_raw_listing(app, docname, pages, groups, env_id, keys):
+    """Return the first page of a list of posts as rendered HTML.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    docname : string
+        The document containing the listing.
+    pages : list of lists of tuples
+        The pages, as given by :py:func:`.paginate`.
+    groups : dict of lists
+        The grouped posts.
+    env_id : dict of strings
+        The references for the groups.
+    keys : list of strings
+        The groups, in the order they are listed.
+
+    Returns
+    -------
+    out : object like :py:class:`.ListingNode`
+        The node with the HTML code.
+
+    """
+    html = render_listing_page(app, docname, pages, 0, groups, env_id, keys)
+    # The names of the groups are kept as text so that they are
+    # found by the search, as for the other formats.
+    node = ListingNode('', nodes.Text(' '.join(str(key) for key in keys)))
+    node['html'] = html.strip() + '\n'
+    return node
+
+
+def make_listing_nodes(app, docname, pages, groups, env_id, keys):
+    """Return the first page of a list of posts as docutils nodes.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    docname : string
+        The document containing the listing.
+    pages : list of lists of tuples
+        The pages, as given by :py:func:`.paginate`.
+    groups : dict of lists
+        The grouped posts.
+    env_id : dict of strings
+        The references for the groups.
+    keys : list of strings
+        The groups, in the order they are listed.
+
+    Returns
+    -------
+    out : list of objects like :py:class:`docutils.nodes.Node`
+        The nodes for the page.
+
+    """
+    first = first_pages(pages)
+    refs = group_refs(app, docname, docname, keys, env_id,
+                      first, 0)
+    section_list = nodes.bullet_list()
+    for key, ref in zip(keys, refs):
+        refuri = None if first[key] == 0 else ref
+        _, section_item = make_new_section(key, groups, env_id,
+                                           refuri=refuri)
+        section_list += section_item
+    par_sections = nodes.paragraph()
+    for key, posts in pages[0]:
+        # For each key add title/section
+        section, _ = make_new_section(key, groups, env_id)
+        # Collect content for this section:
+        section_content = make_item_list(
+            build_item_list(app, docname, posts)
         )
+        par_sections += section
+        par_sections += section_content
+    par = nodes.paragraph()
+    par += section_list
+    content = [par, par_sections]
+    if len(pages) > 1:
+        pagination = PaginationNode()
+        pagination['prev_ref'], pagination['next_ref'] = page_refs(
+            app, docname, docname, 0, len(pages)
+        )
+        pagination['number'] = 1
+        pagination['npages'] = len(pages)
+        content.append(pagination)
+    return content
+
+
+def make_listing_section(app, pagename, key, posts, groups, env_id):
+    """Return a section of a listing page for the template.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    pagename : string
+        The page the section is written to.
+    key : string
+        The group shown in the section.
+    posts : list of objects like :py:class:`.PostRecord`
+        The posts to list in the section.
+    groups : dict of lists
+        The grouped posts.
+    env_id : dict of strings
+        The references for the groups.
+
+    Returns
+    -------
+    out : dict
+        The `id`, `title` and rendered `items` of the section.
+
+    """
+    return {
+        'id': env_id[key],
+        'title': group_title(key, groups),
+        'items': [
+            render_blogoutput(
+                item['post'].title, item['post'].summary,
+                item['refuri'], item['time'],
+            ) for item in build_item_list(app, pagename, posts)
+        ],
+    }
+
+
+@timed('render_listing_page')
+def render_listing_page(app, docname, pages, number, groups, env_id, keys,
+                        title=''):
+    """Return HTML code for a page in a paginated listing.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    docname : string
+        The document containing the listing.
+    pages : list of lists of tuples
+        The pages, as given by :py:func:`.paginate`.
+    number : integer
+        The number of the page to render.
+    groups : dict of lists
+        The grouped posts.
+    env_id : dict of strings
+        The references for the groups.
+    keys : list of strings
+        The groups, in the order they are listed.
+    title : string, optional
+        The title to show on the page.
+
+    Returns
+    -------
+    out : string
+        The HTML code for the page.
+
+    """
+    pagename = page_name(docname, number)
+    refs = group_refs(app, pagename, docname, keys, env_id,
+                      first_pages(pages), number)
+    sections = [
+        make_listing_section(app, pagename, key, posts, groups, env_id)
+        for key, posts in pages[number]
+    ]
+    pagination = ''
+    if len(pages) > 1:
+        prev_ref, next_ref = page_refs(app, pagename, docname, number,
+                                       len(pages))
+        pagination = render_template(
+            'pagination',
+            prev_ref=prev_ref,
+            next_ref=next_ref,
+            number=number + 1,
+            npages=len(pages),
+        )
+    return render_template(
+        'listing',
+        title=title,
+        groups=[
+            {'title': group_title(key, groups), 'ref': ref}
+            for key, ref in zip(keys, refs)
+        ],
+        sections=sections,
+        pagination=pagination,
     )
-    imgraw = os.path.join(imgdir, node['summary_image'])
+
+
+def collect_listing_pages(app):
+    """Create the extra pages for the paginated listings.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+
+    Yields
+    ------
+    out : tuple
+        The name, context and template for each extra page.
+
+    """
+    env = app.builder.env
+    page_size = getattr(env, 'blog_page_size', {})
+    for docname, groups, env_id, reverse, _ in listings(env):
+        if docname not in page_size:
+            continue
+        keys = sorted(groups, reverse=reverse)
+        pages = paginate(groups, keys, page_size[docname])
+        title = ''
+        if docname in env.titles:
+            title = env.titles[docname].astext()
+        for number in range(1, len(pages)):
+            page_title = '{} ({}/{})'.format(title, number + 1, len(pages))
+            body = render_listing_page(app, docname, pages, number,
+                                       groups, env_id, keys,
+                                       title=page_title)
+            STATS.note_page(page_name(docname, number), body)
+            env.blog_extra_pages.add(page_name(docname, number))
+            context = {'title': page_title, 'body': body}
+            yield page_name(docname, number), context, 'page.html'
+
+
+def group_page_name(config, kind, slug):
+    """Return the name of the page for a single tag or category.
+
+    Parameters
+    ----------
+    config : object like :py:class:`sphinx.config.Config`
+        The configuration of the project.
+    kind : string
+        The kind of group, ``'tag'`` or ``'category'``.
+    slug : string
+        The slug of the tag or category.
+
+    Returns
+    -------
+    out : string
+        The page name, e.g. ``posts/tag/python``.
+
+    """
+    return posixpath.join(config.post_directory, kind, slug)
+
+
+def group_ref(app, fromdocname, kind, key):
+    """Return the reference to the posts of a tag or a category.
+
+    With ``blog_group_pages`` the reference is to the page for
+    the tag or category, otherwise it is to its section in the
+    listing of all tags or categories.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    fromdocname : string
+        The document the reference is made from.
+    kind : string
+        The kind of group, ``'tag'`` or ``'category'``.
+    key : string
+        The tag or category.
+
+    Returns
+    -------
+    out : string
+        The reference.
+
+    """
+    env = app.builder.env
+    if app.config.blog_group_pages:
+        pagename = group_page_name(app.config, kind,
+                                   env.blog_index.slugs[kind][key])
+        return get_relative_uri(app, fromdocname, pagename)
+    docname = getattr(env, '{}_docname'.format(kind))
+    env_id = getattr(env, '{}_id'.format(kind))
+    return get_relative_uri(app, fromdocname, docname) + '#' + env_id[key]
+
+
+def collect_group_pages(app):
+    """Create a page for each tag and category.
+
+    This is only done with ``blog_group_pages``. Each page lists
+    the posts of a single tag or category.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+
+    Yields
+    ------
+    out : tuple
+        The name, context and template for each page.
+
+    """
+    if not app.config.blog_group_pages:
+        return
+    env = app.builder.env
+    index = env.blog_index
+    for kind, groups, env_id in (('category', index.categories,
+                                  env.category_id),
+                                 ('tag', index.tags, env.tag_id)):
+        for key, posts in groups.items():
+            pagename = group_page_name(app.config, kind,
+                                       index.slugs[kind][key])
+            title = group_title(key, groups)
+            body = render_template(
+                'listing',
+                title=title,
+                groups=[],
+                sections=[
+                    make_listing_section(app, pagename, key, posts,
+                                         groups, env_id),
+                ],
+                pagination='',
+            )
+            STATS.note_page(pagename, body)
+            env.blog_extra_pages.add(pagename)
+            context = {'title': title, 'body': body}
+            yield pagename, context, 'page.html'
+
+
+def get_image_name(app, env, fromdocname, post):
+    """Return the URI of the summary image, relative to a document."""
+    imgdir = posixpath.dirname(post.docname)
+    imgraw = os.path.join(imgdir, post.summary_image)
     imgstatic = env.images[imgraw][1]
-    imgfile = os.path.join(app.builder.imagedir, imgstatic)
-    return imgfile
+    imgfile = posixpath.join(app.builder.imagedir, imgstatic)
+    return relative_uri(app.builder.get_target_uri(fromdocname), imgfile)
+
+
+def init_thumbnails(app):
+    """Check that thumbnails can be made, if they are requested."""
+    if app.config.blog_thumbnails and not has_pillow():
+        LOGGER.warning('blog_thumbnails requires Pillow, the full summary '
+                       'images are used instead')
 
 
-def update_recent_nodes(app, doctree, env, archive_flat):
+def summary_image_path(app, post):
+    """Return the path to the summary image of a post in the sources."""
+    return os.path.join(app.srcdir, os.path.dirname(post.docname),
+                        post.summary_image)
+
+
+def make_thumbnails(app, env, fromdocname, posts):
+    """Create thumbnails for the summary images of the given posts.
+
+    The thumbnails are made in a process pool and cached, see
+    :py:class:`.ThumbnailCache`, and they are copied to the
+    ``thumbnails`` folder of the images in the output.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    env : object like :py:class:`sphinx.environment.BuildEnvironment`
+        The build environment.
+    fromdocname : string
+        The document showing the thumbnails.
+    posts : list of objects like :py:class:`.PostRecord`
+        The posts to make thumbnails for.
+
+    Returns
+    -------
+    out : dict of dicts
+        For each summary image with thumbnails, the template
+        variables `thumbnail`, `srcset`, `image_width` and
+        `image_height`.
+
+    """
+    config = app.config
+    if not config.blog_thumbnails or not has_pillow():
+        return {}
+    sources = {summary_image_path(app, post) for post in posts
+               if post.summary_image}
+    if env.blog_thumbnails is None:
+        env.blog_thumbnails = ThumbnailCache(
+            os.path.join(app.doctreedir, 'blogpost-thumbnails'),
+            config.blog_thumbnail_widths,
+        )
+    cache = env.blog_thumbnails
+    try:
+        cache.update(sources, jobs=app.parallel if app.parallel > 1 else None)
+    except OSError as error:
+        LOGGER.warning('Could not make thumbnails: %s', error)
+        return {}
+    outdir = os.path.join(app.outdir, app.builder.imagedir, THUMBNAIL_DIR)
+    pageuri = app.builder.get_target_uri(fromdocname)
+    thumbnails = {}
+    for source in sources:
+        info = cache.copy_to(source, outdir)
+        if not info['thumbs']:
+            continue
+        srcset = []
+        for name, width, _ in info['thumbs']:
+            uri = relative_uri(
+                pageuri,
+                posixpath.join(app.builder.imagedir, THUMBNAIL_DIR, name),
+            )
+            srcset.append('{} {}w'.format(uri, width))
+        _, width, height = info['thumbs'][-1]
+        thumbnails[source] = {
+            'thumbnail': uri,
+            'srcset': ', '.join(srcset),
+            'image_width': width,
+            'image_height': height,
+        }
+    return thumbnails
+
+
+def save_thumbnails(app, exception):
+    """Store the information about the thumbnails made in this build."""
+    env = app.builder.env
+    cache = getattr(env, 'blog_thumbnails', None)
+    if exception is not None or cache is None:
+        return
+    cache.save()
+    LOGGER.verbose('blogpost: made thumbnails for %d of %d summary images',
+                   cache.created, len(cache.sources))
+
+
+@timed('update_recent_nodes')
+def update_recent_nodes(app, doctree, env, index):
     """Run the update for recent nodes."""
     for node in doctree.traverse(RecentNode):
-        nmax = min(node['length'], len(archive_flat))
-        node['nmax'] = nmax
+        fromdocname = node['docname']
+        posts = index.recent(node['length'], tags=node['tags'],
+                             category=node['category'],
+                             author=node['author'])
+        node['nmax'] = len(posts)
         node['items'] = []
-        for item in archive_flat[:nmax]:
-            post_node = item['post_node']
-            cat = post_node['category']
+        thumbnails = make_thumbnails(app, env, fromdocname, posts)
+        for post in posts:
+            cat = post.category
             new_item = {
-                'title': post_node['title'],
+                'title': post.title,
                 'category': cat,
-                'short_time': post_node['short_time'],
-                'summary': shorten_text(post_node['summary'], length=100),
-                'time': item['time'],
-                'author': post_node['author'],
+                'short_time': post.short_time,
+                'summary': short_summary(post.summary),
+                'time': post.time,
+                'author': post.author,
                 'has_image': False,
             }
-            new_item['category_ref'] = app.builder.get_relative_uri(
-                env.recent_docname, env.category_docname
+            new_item['category_ref'] = group_ref(
+                app, fromdocname, 'category', cat
             )
-            new_item['category_ref'] += '#' + env.category_id[cat]
             new_item['tags_and_ref'] = []
 
-            if post_node['summary_image']:
+            if post.summary_image:
                 new_item['has_image'] = True
-                new_item['imagefile'] = get_image_name(
-                    app, env, item['docname'], post_node
+                new_item['imagefile'] = get_image_name(app, env, fromdocname,
+                                                      post)
+                new_item.update(
+                    thumbnails.get(summary_image_path(app, post), {})
                 )
 
-            for tag in post_node['tags']:
-                ref = app.builder.get_relative_uri(
-                    env.recent_docname, env.tag_docname
-                )
-                ref += '#' + env.tag_id[tag]
+            for tag in post.tags:
+                ref = group_ref(app, fromdocname, 'tag', tag)
                 new_item['tags_and_ref'].append({'tag': tag, 'ref': ref})
-            new_item['post_ref'] = app.builder.get_relative_uri(
-                env.recent_docname, post_node['docname']
+            new_item['post_ref'] = get_relative_uri(
+                app, fromdocname, post.docname
             )
-            new_item['post_ref'] += '#' + post_node['targetid']
+            new_item['post_ref'] += '#' + post.targetid
             node['items'].append(new_item)
 
 
+@timed('process_blog_posts')
 def process_blog_posts(app, doctree, fromdocname):
     """Process the categories encountered in the blog posts."""
     env = app.builder.env
+    if not has_blog_nodes(doctree):
+        return
+    index = env.blog_index
 
-    categories = build_category_info(app, fromdocname)
-    tags = build_tag_info(app, fromdocname)
-    archive, archive_flat = build_archive_info(app, fromdocname)
-
-    update_node_replace(doctree, CategoryNode, categories,
-                        env.category_id)
-    update_node_replace(doctree, TagNode, tags, env.tag_id)
-    update_node_replace(doctree, ArchiveNode, archive, env.archive_id,
-                        reverse=True)
-    update_recent_nodes(app, doctree, env, archive_flat)
+    update_node_replace(app, doctree, fromdocname, CategoryNode,
+                        index.categories, env.category_id)
+    update_node_replace(app, doctree, fromdocname, TagNode, index.tags,
+                        env.tag_id)
+    update_node_replace(app, doctree, fromdocname, ArchiveNode,
+                        index.archive, env.archive_id, reverse=True)
+    update_recent_nodes(app, doctree, env, index)
     # Also update category refs for post nodes:
     for node in doctree.traverse(BlogNode):
         cat = node['category']
-        node['category_ref'] = app.builder.get_relative_uri(
-            node['docname'], env.category_docname
+        node['category_ref'] = group_ref(
+            app, node['docname'], 'category', cat
         )
-        node['category_ref'] += '#' + env.category_id[cat]
         node['tags_ref'] = []
         for tag in node['tags']:
-            ref = app.builder.get_relative_uri(
-                node['docname'], env.tag_docname
-            )
-            ref += '#' + env.tag_id[tag]
+            ref = group_ref(app, node['docname'], 'tag', tag)
             node['tags_ref'].append(ref)
         node['tags_and_ref'] = []
         for tag, ref in zip(node['tags'], node['tags_ref']):
             node['tags_and_ref'].append({'tag': tag, 'ref': ref})
-        add_next_prev(app, node, archive_flat)
+        add_next_prev(app, node, index)
+        node['related'] = related_refs(app, env, node)
 
     for node in doctree.traverse(TagListNode):
         node['tags_ref'] = []
         node['tags'] = []
-        for tag in tags:
+        for tag in sorted(index.tags):
             node['tags'].append(tag)
-            ref = app.builder.get_relative_uri(
-                node['docname'], env.tag_docname
-            )
-            ref += '#' + env.tag_id[tag]
+            ref = group_ref(app, node['docname'], 'tag', tag)
             node['tags_ref'].append(ref)
         node['tags_and_ref'] = []
         for tag, ref in zip(node['tags'], node['tags_ref']):
             node['tags_and_ref'].append({'tag': tag, 'ref': ref})
 
+    for node in doctree.traverse(PostIndexNode):
+        if not app.config.blog_json_index:
+            LOGGER.warning('blog-post-index needs blog_json_index = True',
+                           location=node)
+        node['index_uri'] = relative_uri(
+            app.builder.get_target_uri(fromdocname),
+            json_index_name(app.config),
+        )
+
+
+def add_next_prev(app, node, index):
+    """Add next/prev navigation for a node.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    node : object like :py:class:`.BlogNode`
+        The post to add the navigation for.
+    index : object like :py:class:`.PostIndex`
+        The index with the sorted posts.
 
-def add_next_prev(app, node, archive_flat):
-    """Add next/prev navigation for a node."""
+    """
+    archive_flat = index.posts
     postmax = len(archive_flat) - 1
-    for i, item in enumerate(archive_flat):
-        if node['time'] == item['time']:
-            idx_prev = i + 1
-            if idx_prev > postmax:
-                idx_prev = 0
-                node['prev_text'] = '&olarr; Newest'
-            else:
-                node['prev_text'] = '&larr; Previous'
-            idx_next = i - 1
-            if idx_next < 0:
-                idx_next = postmax
-                node['next_text'] = 'Oldest &orarr;'
-            else:
-                node['next_text'] = 'Next &rarr;'
-            node['next'] = app.builder.get_relative_uri(
-                node['docname'], archive_flat[idx_next]['docname']
-            )
-            node['prev'] = app.builder.get_relative_uri(
-                node['docname'], archive_flat[idx_prev]['docname']
-            )
+    i = index.position[(node['docname'], node['targetid'])]
+    idx_prev = i + 1
+    if idx_prev > postmax:
+        idx_prev = 0
+        node['prev_text'] = '&olarr; Newest'
+    else:
+        node['prev_text'] = '&larr; Previous'
+    idx_next = i - 1
+    if idx_next < 0:
+        idx_next = postmax
+        node['next_text'] = 'Oldest &orarr;'
+    else:
+        node['next_text'] = 'Next &rarr;'
+    node['next'] = get_relative_uri(
+        app, node['docname'], archive_flat[idx_next].docname
+    )
+    node['prev'] = get_relative_uri(
+        app, node['docname'], archive_flat[idx_prev].docname
+    )
+
 
+def make_toc(sections, head='Tags'):
+    """Make toc for the sections on a listing page.
 
-def make_toc(doctree, head='Tags'):
-    """Make toc from a doctree."""
+    Parameters
+    ----------
+    sections : list of tuples
+        The id and the title of each section on the page.
+    head : string, optional
+        The heading of the toc.
+
+    Returns
+    -------
+    out : string
+        The HTML code for the toc.
+
+    """
     fmt = '<li><a class="reference internal" href="{}">{}</a></li>'
     toc = [
         '<ul>',
         '<li><a class="reference internal" href="#">{}</a><ul>'.format(head),
     ]
-    for node in doctree.traverse(nodes.section):
-        if 'blog' in node:
-            tag = node['ids'][0]
-            toc.append(fmt.format('#'+tag, node['blog']))
+    for tag, title in sections:
+        toc.append(fmt.format('#'+tag, title))
     toc.append('</ul>')
     toc.append('</li>')
     toc.append('</ul>')
     return '\n'.join(toc)
 
 
+def listing_tocs(app):
+    """Return the toc for each page of the lists of posts.
+
+    The tocs are made from the post index the first time they are
+    needed in a build, and are then kept in ``env.blog_tocs``. As
+    in :py:func:`.update_node_replace`, the lists are only
+    paginated for HTML.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+
+    Returns
+    -------
+    out : dict of strings
+        The HTML code for the toc, for each page of the lists of
+        categories, tags and the archive.
+
+    """
+    env = app.builder.env
+    if env.blog_tocs is None:
+        page_size = {}
+        if app.builder.format == 'html':
+            page_size = getattr(env, 'blog_page_size', {})
+        tocs = {}
+        for docname, groups, env_id, reverse, head in listings(env):
+            keys = sorted(groups, reverse=reverse)
+            pages = paginate(groups, keys, page_size.get(docname))
+            for number, page in enumerate(pages):
+                sections = [
+                    (env_id[key], group_title(key, groups)) for key, _ in page
+                ]
+                tocs[page_name(docname, number)] = make_toc(sections,
+                                                            head=head)
+        env.blog_tocs = tocs
+    return env.blog_tocs
+
+
 def modify_toc(app, pagename, templatename, context, doctree):
     """Add contents to toc in a hackish way.
 
     The `toc` is used to add items to the `page` in the navigation bar.
     """
     # pylint: disable=unused-argument
+    toc = listing_tocs(app).get(pagename)
+    if toc is not None:
+        context['toc'] = toc
+
+
+def note_listing_page(app, pagename, templatename, context, doctree):
+    """Store the size of a listing document for the instrumentation."""
+    # pylint: disable=unused-argument
+    if STATS.enabled and pagename in listing_docnames(app.builder.env):
+        STATS.note_page(pagename, context.get('body', ''))
+
+
+def init_instrumentation(app):
+    """Reset the timers and counters for a new build."""
+    STATS.reset(app.config.blog_instrumentation)
+
+
+def write_instrumentation(app, exception):
+    """Write the report of the instrumentation and print a summary.
+
+    The report is written as JSON to ``blogpost-report.json`` in
+    the directory of the doctrees, so that it is not published
+    with the site.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    exception : object like :py:class:`Exception` or None
+        The exception raised during the build, if any.
+
+    """
+    if exception is not None or not STATS.enabled:
+        return
+    env = app.builder.env
+    extra = {'posts': len(stored_posts(env))}
+    if hasattr(env, 'blog_uri_cache'):
+        cache = env.blog_uri_cache
+        extra['uri_cache'] = {
+            'size': len(cache), 'hits': cache.hits, 'misses': cache.misses,
+        }
+    path = os.path.join(app.doctreedir, 'blogpost-report.json')
+    STATS.write_report(path, extra=extra)
+    LOGGER.info('blogpost: %s (report in %s)', STATS.summary(), path)
+
+
+def report_uri_cache(app, exception):
+    """Report how often the relative URIs were found in the cache."""
     env = app.builder.env
-    postdir = env.config.post_directory
-    for key in ('tags', 'categories', 'archive'):
-        dirname = os.path.join(postdir, key)
-        if dirname in pagename:
-            context['toc'] = make_toc(doctree, head=key.title())
+    if exception is not None or not hasattr(env, 'blog_uri_cache'):
+        return
+    cache = env.blog_uri_cache
+    LOGGER.verbose(
+        'blogpost: %d relative URIs, %d hits, %d misses (hit rate %.1f%%)',
+        len(cache), cache.hits, cache.misses, 100 * cache.hit_rate,
+    )
+
+
+def feed_entry(app, feedname, post):
+    """Return the information about a post needed for a feed.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    feedname : string
+        The path of the feed file, relative to the output directory.
+    post : object like :py:class:`.PostRecord`
+        The post to add to the feed.
+
+    Returns
+    -------
+    out : dict
+        The information about the post.
+
+    """
+    return {
+        'title': post.title,
+        'url': feed_url(app, feedname, post.docname) + '#' + post.targetid,
+        'time': post.time,
+        'author': post.author,
+        'category': post.category,
+        'tags': post.tags,
+        'summary': post.summary,
+    }
+
+
+def feed_url(app, feedname, docname=None):
+    """Return the absolute URL for a document as given in a feed.
+
+    Feed readers need absolute URLs, which are built from
+    ``html_baseurl``.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    feedname : string
+        The path of the feed file, relative to the output directory.
+    docname : string, optional
+        The document to return the URL for. If not given, the
+        URL of the feed itself is returned.
+
+    Returns
+    -------
+    out : string
+        The URL.
+
+    """
+    if docname is None:
+        target = feedname
+    else:
+        target = app.builder.get_target_uri(docname)
+    return app.config.html_baseurl.rstrip('/') + '/' + target
+
+
+def write_feeds(app, exception):
+    """Write the feeds for all posts and for each tag and category.
+
+    Only the newest ``blog_feed_length`` posts are included in each
+    feed, and feeds whose contents are unchanged are not rewritten.
+    The feeds require ``html_baseurl``, since the ids and links of
+    the entries must be absolute URLs. Without it, a warning is given
+    and no feeds are written.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    exception : object like :py:class:`Exception` or None
+        The exception raised during the build, if any.
+
+    """
+    config = app.config
+    if exception is not None or not config.blog_feeds:
+        return
+    if app.builder.format != 'html':
+        return
+    if not config.html_baseurl:
+        LOGGER.warning('blogpost: blog_feeds requires html_baseurl to be '
+                       'set, no feeds were written')
+        return
+    # pylint: disable=import-outside-toplevel
+    from blogpost.feeds import write_feed
+    index = app.builder.env.blog_index
+    feeds = [('all', config.project, index.posts)]
+    for kind, groups, slugs in (
+            ('tags', index.tags, index.slugs['tag']),
+            ('categories', index.categories, index.slugs['category']),
+    ):
+        for key, posts in groups.items():
+            feeds.append(
+                (
+                    '{}/{}'.format(kind, slugs[key]),
+                    '{}: {}'.format(config.project, key),
+                    posts,
+                )
+            )
+    written = 0
+    for name, title, posts in feeds:
+        posts = posts[:config.blog_feed_length]
+        feedname = '{}/{}.xml'.format(config.blog_feed_directory, name)
+        feed = {
+            'title': title,
+            'url': feed_url(app, feedname),
+            'site_url': feed_url(app, feedname, config.root_doc),
+            'updated': posts[0].time if posts else None,
+        }
+        entries = (feed_entry(app, feedname, post) for post in posts)
+        written += write_feed(
+            os.path.join(app.outdir, feedname), feed, entries,
+            fmt=config.blog_feed_format,
+        )
+    LOGGER.verbose('blogpost: wrote %d of %d feeds', written, len(feeds))
+
+
+def compressed_files(app):
+    """Return the files written by the extension, for compression.
+
+    These are the documents listing posts from all documents, the
+    extra listing pages, and, if enabled, the feeds, the JSON index
+    and the prepared static files.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+
+    Returns
+    -------
+    out : list of strings
+        The paths to the files.
+
+    """
+    config = app.config
+    env = app.builder.env
+    pagenames = listing_docnames(env) & env.found_docs
+    pagenames |= getattr(env, 'blog_extra_pages', set())
+    paths = [
+        os.fspath(app.builder.get_outfilename(i)) for i in sorted(pagenames)
+    ]
+    directories = []
+    if config.blog_feeds:
+        directories.append(config.blog_feed_directory)
+    if config.blog_json_index:
+        directories.append(config.blog_json_directory)
+    for directory in directories:
+        for dirpath, _, filenames in os.walk(
+                os.path.join(app.outdir, directory)
+        ):
+            paths.extend(
+                os.path.join(dirpath, filename)
+                for filename in sorted(filenames)
+                if not filename.endswith(COMPRESSED_SUFFIXES)
+            )
+    if config.blog_assets:
+        static_dir = os.path.join(app.outdir, '_static')
+        paths.extend(
+            os.path.join(static_dir, filename)
+            for filename in sorted(os.listdir(static_dir))
+            if filename.startswith('blogpost-') and
+            not filename.endswith(COMPRESSED_SUFFIXES)
+        )
+    return paths
+
+
+def write_compressed_files(app, exception):
+    """Write pre-compressed copies of the files of the extension.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    exception : object like :py:class:`Exception` or None
+        The exception raised during the build, if any.
+
+    """
+    if exception is not None or not app.config.blog_precompress:
+        return
+    if app.builder.format != 'html':
+        return
+    # pylint: disable=import-outside-toplevel
+    from blogpost.compress import CompressionCache, compress_formats
+    paths = compressed_files(app)
+    cache = CompressionCache(
+        os.path.join(app.doctreedir, 'blogpost-compressed.json'),
+        compress_formats(),
+    )
+    try:
+        cache.update(paths, jobs=app.parallel if app.parallel > 1 else None)
+    except OSError as error:
+        LOGGER.warning('Could not compress files: %s', error)
+        return
+    cache.save()
+    LOGGER.verbose('blogpost: compressed %d of %d files (%s)',
+                   cache.compressed, len(paths), ', '.join(cache.formats))
+
+
+def json_index_name(config):
+    """Return the path of the JSON index manifest in the output."""
+    return posixpath.join(config.blog_json_directory, MANIFEST)
+
+
+def init_static_files(app):
+    """Add the style sheet and the script for the JSON index to the pages.
+
+    With ``blog_json_index``, the script is written to the ``_static``
+    folder of the output, and it is added to the pages with a post
+    index by :py:func:`.add_index_script`. With ``blog_assets``, the
+    style sheet and the script are minified, with a hash of the
+    contents in the file names. With ``blog_critical_css``, the rules
+    needed by the cards of the recent posts and the blog posts are
+    also prepared for inlining, and the style sheet is added to each
+    page by :py:func:`.inline_critical_css`.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+
+    """
+    config = app.config
+    ASSETS['critical_css'] = ''
+    ASSETS['critical_style'] = ''
+    ASSETS['index_script'] = ''
+    if app.builder.format != 'html':
+        return
+    static_dir = os.path.join(app.outdir, '_static')
+    if config.blog_json_index:
+        source = os.path.join(STATIC_DIR, 'blogpost-index.js')
+        if config.blog_assets:
+            name, script = build_asset(source, 'blogpost-index.js', minify_js)
+        else:
+            name = 'blogpost-index.js'
+            with open(source, encoding='utf-8') as infile:
+                script = infile.read()
+        write_asset(os.path.join(static_dir, name), script)
+        ASSETS['index_script'] = name
+    if not config.blog_assets:
+        return
+    name, css = build_asset(os.path.join(STATIC_DIR, 'style.css'),
+                            'blogpost-style.css', minify_css)
+    write_asset(os.path.join(static_dir, name), css)
+    if not config.blog_critical_css:
+        app.add_css_file(name)
+        return
+    classes = template_classes(
+        template_path(filename) for filename in CRITICAL_TEMPLATES
+    )
+    ASSETS['critical_css'] = critical_css(css, classes)
+    ASSETS['critical_style'] = name
+
+
+def write_asset(path, content):
+    """Write a prepared static file, unless it is up to date."""
+    if update_file(path, lambda output: output.write(content)):
+        LOGGER.verbose('blogpost: wrote %s', os.path.basename(path))
+
+
+def add_index_script(app, pagename, templatename, context, doctree):
+    """Add the script for the JSON index to the pages with a post index."""
+    # pylint: disable=unused-argument
+    name = ASSETS['index_script']
+    if not name or doctree is None:
+        return
+    if doctree.next_node(PostIndexNode) is None:
+        return
+    app.add_js_file(name, defer='defer')
+
+
+def inline_critical_css(app, pagename, templatename, context, doctree):
+    """Inline the style of the cards in the pages showing them.
+
+    The rules are added to the ``metatags`` of the page, which are
+    placed in the head by the Sphinx layout. The full style sheet is
+    then loaded without blocking the rendering of the page: it is
+    added with ``media="print"``, which is switched to ``all`` once
+    it has been loaded (with a ``<noscript>`` fallback). Pages
+    without cards load the style sheet as usual.
+    """
+    # pylint: disable=unused-argument
+    name = ASSETS['critical_style']
+    if not name:
+        return
+    css = ASSETS['critical_css']
+    if not css or doctree is None or doctree.next_node(
+            lambda node: isinstance(node, (BlogNode, RecentNode))
+    ) is None:
+        app.add_css_file(name)
+        return
+    app.add_css_file(name, media='print', onload="this.media='all'")
+    href = context['pathto']('_static/' + name, 1)
+    context['metatags'] = (
+        '{}\n<style>{}</style>\n'
+        '<noscript><link rel="stylesheet" href="{}" /></noscript>'
+    ).format(context.get('metatags', ''), css, href)
+
+
+def json_entry(app, post):
+    """Return the information about a post stored in the JSON index."""
+    return {
+        'title': post.title,
+        'time': post.time.isoformat(),
+        'category': post.category,
+        'tags': list(post.tags),
+        'summary': short_summary(post.summary),
+        'url': app.builder.get_target_uri(post.docname) + '#' + post.targetid,
+    }
+
+
+def write_json_index(app, exception):
+    """Write the JSON index of the posts, with one shard per year.
+
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
+    exception : object like :py:class:`Exception` or None
+        The exception raised during the build, if any.
+
+    """
+    config = app.config
+    if exception is not None or not config.blog_json_index:
+        return
+    if app.builder.format != 'html':
+        return
+    written, total = write_index(
+        os.path.join(app.outdir, config.blog_json_directory),
+        relative_uri(json_index_name(config), ''),
+        app.builder.env.blog_index.archive,
+        lambda post: json_entry(app, post),
+    )
+    LOGGER.verbose('blogpost: wrote %d of %d JSON index files',
+                   written, total)
 
 
 def setup(app):
@@ -507,17 +1910,70 @@ def setup(app):
         BlogNode,
         html=(html_visit_blogpost, html_depart_blogpost),
     )
+    app.add_node(
+        PaginationNode,
+        html=(html_visit_pagination, html_depart_pagination),
+    )
+    app.add_node(
+        ListingNode,
+        html=(html_visit_listing, None),
+    )
+    app.add_node(
+        PostIndexNode,
+        html=(html_visit_postindex, html_depart_postindex),
+    )
     app.add_node(
         BlogOutputNode,
         html=(html_visit_blogoutput, html_depart_blogoutput),
     )
     app.add_config_value('post_directory', 'posts', 'env')
+    app.add_config_value('blog_group_pages', False, 'html')
+    app.add_config_value('blog_feeds', False, 'html')
+    app.add_config_value('blog_feed_length', 20, 'html')
+    app.add_config_value('blog_feed_format', 'atom', 'html')
+    app.add_config_value('blog_feed_directory', 'feeds', 'html')
+    app.add_config_value('blog_json_index', False, 'html')
+    app.add_config_value('blog_json_directory', 'blog-index', 'html')
+    app.add_config_value('blog_related_posts', 0, 'html')
+    app.add_config_value('blog_assets', False, 'html')
+    app.add_config_value('blog_critical_css', False, 'html')
+    app.add_config_value('blog_precompress', False, 'html')
+    app.add_config_value('blog_instrumentation', False, '')
+    app.add_config_value('blog_metadata_db', False, '')
+    app.add_config_value('blog_thumbnails', False, 'html')
+    app.add_config_value('blog_thumbnail_widths', [320, 640], 'html')
     app.add_directive('blog-post', BlogPostDirective)
     app.add_directive('blog-post-categories', BlogCategoryDirective)
     app.add_directive('blog-post-tags', BlogTagDirective)
     app.add_directive('blog-post-archive', BlogArchiveDirective)
     app.add_directive('blog-post-recent', BlogRecentDirective)
     app.add_directive('blog-post-list-tags', BlogTagListDirective)
+    app.add_directive('blog-post-index', BlogPostIndexDirective)
+    app.connect('builder-inited', init_instrumentation)
+    app.connect('builder-inited', init_templates)
+    app.connect('builder-inited', init_static_files)
+    app.connect('builder-inited', init_thumbnails)
+    app.connect('env-get-outdated', get_outdated_posts)
+    app.connect('env-purge-doc', purge_blog_posts)
+    app.connect('env-before-read-docs', note_read_docnames)
+    app.connect('env-merge-info', merge_blog_posts)
+    app.connect('env-updated', build_post_index)
     app.connect('doctree-resolved', process_blog_posts)
+    app.connect('html-collect-pages', collect_listing_pages)
+    app.connect('html-collect-pages', collect_group_pages)
     app.connect('html-page-context', modify_toc)
-    return {'version': '0.1'}
+    app.connect('html-page-context', note_listing_page)
+    app.connect('html-page-context', add_index_script)
+    app.connect('html-page-context', inline_critical_css)
+    app.connect('build-finished', write_feeds)
+    app.connect('build-finished', write_json_index)
+    app.connect('build-finished', report_uri_cache)
+    app.connect('build-finished', save_thumbnails)
+    app.connect('build-finished', write_compressed_files)
+    app.connect('build-finished', write_instrumentation)
+    return {
+        'version': '0.1',
+        'env_version': 2,
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
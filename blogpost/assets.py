@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Methods for preparing the static files of the extension.
+
+The style sheet and script are minified and written with a hash of
+their contents in the file name, so that they can be cached for a
+long time. The rules of the style sheet needed by the cards of the
+recent posts and the blog posts can also be inlined in the pages
+showing them.
+
+Note
+----
+The minification is deliberately simple: comments and unneeded
+white space are removed, nothing is renamed or rewritten. Quoted
+strings are always kept as they are.
+"""
+import hashlib
+import os
+import re
+
+
+CSS_STRING = r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\''
+# Strings are matched first, so that they are skipped as a whole:
+CSS_COMMENT = re.compile(r'({})|/\*.*?\*/'.format(CSS_STRING), re.DOTALL)
+CSS_SPLIT = re.compile(r'({})'.format(CSS_STRING), re.DOTALL)
+CSS_BRACE = re.compile(r'{}|([{{}}])'.format(CSS_STRING), re.DOTALL)
+CSS_SPACE = re.compile(r'\s+')
+CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+JS_HEADER = re.compile(r'\A\s*/\*.*?\*/\s*', re.DOTALL)
+CLASS_ATTRIBUTE = re.compile(r'class\s*=\s*"([^"{}]*)"')
+CLASS_SELECTOR = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+CRITICAL_TEMPLATES = ('recent.html', 'blogpost.html')
+# The style sheet rules to inline in the pages with cards, the name
+# of the style sheet to load after them, and the name of the script
+# for the JSON index:
+ASSETS = {'critical_css': '', 'critical_style': '', 'index_script': ''}
+
+
+def minify_css_code(text):
+    """Remove unneeded white space from a style sheet without strings."""
+    text = CSS_SPACE.sub(' ', text)
+    text = CSS_PUNCTUATION.sub(r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}')
+
+
+def minify_css(text):
+    """Remove comments and unneeded white space from a style sheet."""
+    text = CSS_COMMENT.sub(lambda match: match.group(1) or '', text)
+    parts = CSS_SPLIT.split(text)
+    # The strings are at the odd positions, and are kept as they are:
+    parts[::2] = [minify_css_code(part) for part in parts[::2]]
+    return ''.join(parts).strip()
+
+
+def minify_js(text):
+    """Remove the header comment and the indentation from a script.
+
+    The line breaks are kept, so that automatic semicolon insertion
+    works as before.
+    """
+    text = JS_HEADER.sub('', text)
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line) + '\n'
+
+
+def fingerprint(name, content):
+    """Add a hash of the contents to a file name.
+
+    Parameters
+    ----------
+    name : string
+        The file name, e.g. ``'style.css'``.
+    content : string
+        The contents of the file.
+
+    Returns
+    -------
+    out : string
+        The file name with the hash, e.g. ``'style.0123456789.css'``.
+
+    """
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:10]
+    stem, ext = os.path.splitext(name)
+    return '{}.{}{}'.format(stem, digest, ext)
+
+
+def template_classes(paths):
+    """Return the classes used in the ``class`` attributes of templates."""
+    classes = set()
+    for path in paths:
+        with open(path, encoding='utf-8') as infile:
+            for match in CLASS_ATTRIBUTE.finditer(infile.read()):
+                classes.update(match.group(1).split())
+    return classes
+
+
+def css_rules(text):
+    """Yield the top level rules of a minified style sheet.
+
+    Parameters
+    ----------
+    text : string
+        The style sheet, as returned by :py:func:`.minify_css`.
+
+    Yields
+    ------
+    out : tuple of strings
+        The selector and the full text of each rule. At-rules,
+        such as ``@media``, are given with their full prelude as
+        the selector.
+
+    """
+    depth, start = 0, 0
+    for match in CSS_BRACE.finditer(text):
+        char, i = match.group(1), match.start()
+        if char == '{':
+            if depth == 0:
+                selector_end = i
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                yield text[start:selector_end], text[start:i + 1]
+                start = i + 1
+
+
+def critical_css(text, classes):
+    """Select the rules of a style sheet for the given classes.
+
+    A rule is selected if one of its selectors only uses classes
+    from `classes`. At-rules are never selected.
+
+    Parameters
+    ----------
+    text : string
+        The minified style sheet.
+    classes : set of strings
+        The classes in use.
+
+    Returns
+    -------
+    out : string
+        The selected rules.
+
+    """
+    selected = []
+    for selector, rule in css_rules(text):
+        if selector.startswith('@'):
+            continue
+        for part in selector.split(','):
+            used = CLASS_SELECTOR.findall(part)
+            if used and classes.issuperset(used):
+                selected.append(rule)
+                break
+    return ''.join(selected)
+
+
+def build_asset(source, name, minify):
+    """Read and minify a static file and give it a fingerprinted name.
+
+    Parameters
+    ----------
+    source : string
+        The path to the file.
+    name : string
+        The name to fingerprint, e.g. ``'blogpost-style.css'``.
+    minify : callable
+        The method for minifying the file.
+
+    Returns
+    -------
+    out : tuple of strings
+        The fingerprinted name and the minified contents.
+
+    """
+    with open(source, encoding='utf-8') as infile:
+        content = minify(infile.read())
+    return fingerprint(name, content), content
@@ -3,10 +3,13 @@
 # Distributed under the LGPLv2.1+ License. See LICENSE for more info.
 """An extension for sphinx for making a blog-like web page."""
 from datetime import datetime
+import hashlib
 import os
+import re
 from docutils import nodes
 from docutils.parsers.rst import Directive
-from docutils.parsers.rst.directives import positive_int
+from docutils.parsers.rst.directives import flag, positive_int
+from blogpost.instrument import timed
 
 
 BLOG_ITEMS = {
@@ -51,6 +54,72 @@ def shorten_text(text, length=50, suffix='...'):
     return text[:length].rsplit(' ', 1)[0] + suffix
 
 
+def slugify(text):
+    """Make a string usable in file names and URLs.
+
+    Parameters
+    ----------
+    text : string
+        The text to convert, e.g. the name of a tag.
+
+    Returns
+    -------
+    out : string
+        The text in lower case, with anything but letters and
+        digits replaced by single dashes.
+
+    """
+    slug = re.sub(r'[^\w]+', '-', text.lower(), flags=re.UNICODE)
+    slug = slug.replace('_', '-').strip('-')
+    return slug or 'none'
+
+
+def unique_slugs(names):
+    """Make slugs for several names, without collisions.
+
+    Parameters
+    ----------
+    names : iterable of strings
+        The names to create slugs for.
+
+    Returns
+    -------
+    out : dict of strings
+        The slug for each name. If several names give the same slug,
+        a short hash of the name is added to the slug of each of them,
+        except for a name equal to the slug, e.g. ``c`` for ``c`` and
+        ``c-8ea2d5`` for ``c++``.
+
+    Note
+    ----
+    The slug of a name only depends on the name itself, and on the
+    other names giving the same slug. Adding or removing names with
+    another slug does therefore not change it. When a colliding name
+    is added, the references of the posts with the renamed tag or
+    category are updated by :py:func:`.renamed_group_docnames`.
+
+    """
+    groups = {}
+    for name in names:
+        groups.setdefault(slugify(str(name)), []).append(name)
+    used = set(groups)
+    slugs = {}
+    for base, group in sorted(groups.items()):
+        for name in sorted(group, key=str):
+            if len(group) == 1 or str(name) == base:
+                slugs[name] = base
+                continue
+            digest = hashlib.sha1(str(name).encode('utf-8')).hexdigest()
+            length = 6
+            slug = '{}-{}'.format(base, digest[:length])
+            while slug in used:
+                length += 1
+                slug = '{}-{}'.format(base, digest[:length])
+            used.add(slug)
+            slugs[name] = slug
+    return slugs
+
+
 def cvs_to_list(argument):
     """Extract comma-separated values.
 
@@ -85,6 +154,78 @@ def stripped(argument):
     return argument.strip()
 
 
+def stripped_lower(argument):
+    """Return the argument text, stripped and in lower case.
+
+    This is used for tags, which are stored in lower case by
+    :py:func:`.cvs_to_list`.
+
+    Parameters
+    ----------
+    argument : string
+        The input text to strip.
+
+    """
+    return stripped(argument).lower()
+
+
+class PostRecord:
+    """The information about a blog post stored in the environment.
+
+    The record holds the items given in :py:data:`BLOG_ITEMS`,
+    together with the document and the target id of the post. The
+    `time` is stored as a :py:class:`datetime.datetime` and the
+    `tags` as a tuple of strings. Records are immutable and they
+    are kept small since they are pickled with the environment.
+
+    """
+
+    __slots__ = tuple(BLOG_ITEMS) + ('docname', 'targetid')
+
+    def __init__(self, **kwargs):
+        """Set up the record.
+
+        Parameters
+        ----------
+        kwargs : dict
+            The value for each of the items in the record.
+
+        """
+        for key in self.__slots__:
+            object.__setattr__(self, key, kwargs[key])
+
+    def __setattr__(self, key, value):
+        """Refuse to modify the record."""
+        raise AttributeError('PostRecord objects can not be modified')
+
+    def __delattr__(self, key):
+        """Refuse to modify the record."""
+        raise AttributeError('PostRecord objects can not be modified')
+
+    def __getstate__(self):
+        """Return the values of the record, for pickling."""
+        return tuple(getattr(self, key) for key in self.__slots__)
+
+    def __setstate__(self, state):
+        """Restore the values of the record, after unpickling."""
+        for key, value in zip(self.__slots__, state):
+            object.__setattr__(self, key, value)
+
+    @property
+    def short_time(self):
+        """Return the date of the post, for display."""
+        return self.time.strftime(BlogPostDirective.short_date_format)
+
+    @property
+    def year(self):
+        """Return the year of the post."""
+        return self.time.year
+
+    def __repr__(self):
+        """Return a short representation of the record."""
+        return 'PostRecord({!r}, {!r})'.format(self.docname, self.targetid)
+
+
 class BlogNode(nodes.General, nodes.Element):
     """A simple node for a blog post.
 
@@ -170,6 +311,65 @@ class RecentNode(nodes.General, nodes.Element):
     pass
 
 
+class PaginationNode(nodes.General, nodes.Element):
+    """A simple node for navigating between pages of a listing.
+
+    This node is added to the first page of the paginated lists of
+    categories, tags and the archive.
+
+    """
+
+    # pylint: disable=unused-argument
+    pass
+
+
+class ListingNode(nodes.General, nodes.Element):
+    """A node holding a list of posts rendered as HTML.
+
+    This node replaces the nodes for the lists of categories, tags
+    and the archive when writing HTML. The HTML code is kept in an
+    attribute rather than as text, so that the summaries of the
+    posts are not added to the search index.
+
+    """
+
+    # pylint: disable=unused-argument
+    pass
+
+
+class PostIndexNode(nodes.General, nodes.Element):
+    """A simple node for a list of posts loaded from the JSON index.
+
+    This node is used by :py:class:`.BlogPostIndexDirective`. The
+    posts are not stored in the node, they are loaded by a script
+    in the browser.
+
+    """
+
+    # pylint: disable=unused-argument
+    pass
+
+
+def note_page_size(env, node, options):
+    """Store the page size of a listing directive.
+
+    Parameters
+    ----------
+    env : object like :py:class:`sphinx.environment.BuildEnvironment`
+        The build environment, ``env.blog_page_size`` is updated here.
+    node : object like :py:class:`docutils.nodes.Element`
+        The node for the listing.
+    options : dict
+        The options given to the directive.
+
+    """
+    node['page_size'] = options.get('page-size')
+    if not hasattr(env, 'blog_page_size'):
+        env.blog_page_size = {}
+    if node['page_size']:
+        env.blog_page_size[env.docname] = node['page_size']
+
+
 class BlogPostDirective(Directive):
     """A directive representing a blog post."""
 
@@ -188,6 +388,7 @@ class BlogPostDirective(Directive):
             option_spec[key] = stripped
         empty_defaults[key] = option_spec[key](None)
 
+    @timed('directive blog-post', returns_nodes=True)
     def run(self):
         """Execute the directive parsing."""
         node = BlogNode()
@@ -223,17 +424,12 @@ class BlogPostDirective(Directive):
                 env.images.add_file('', img['uri'])
                 sub += img
                 return_nodes.append(sub)
-            if not hasattr(env, 'all_posts'):
-                env.all_posts = []
-            env.all_posts.append(
-                {
-                    'time': time,
-                    'post_node': node.deepcopy(),
-                    'docname': env.docname,
-                    'datetime': time,
-                    'targetid': targetid,
-                    'targetnode': targetnode,
-                }
+            if not hasattr(env, 'blog_posts'):
+                env.blog_posts = {}
+            fields = {key: node[key] for key in BLOG_ITEMS}
+            fields['tags'] = tuple(node['tags'])
+            env.blog_posts.setdefault(env.docname, []).append(
+                PostRecord(docname=env.docname, targetid=targetid, **fields)
             )
             return_nodes.append(targetnode)
             return_nodes.append(node)
@@ -247,7 +443,9 @@ class BlogCategoryDirective(Directive):
     """A directive for listing the categories."""
 
     has_content = False
+    option_spec = {'page-size': positive_int}
 
+    @timed('directive blog-post-categories', returns_nodes=True)
     def run(self):
         """Parse directive."""
         node = CategoryNode()
@@ -257,6 +455,7 @@ class BlogCategoryDirective(Directive):
         else:
             raise ValueError('Only one category list is supported!')
         node['categories'] = []
+        note_page_size(env, node, self.options)
         return [node]
 
 
@@ -264,7 +463,9 @@ class BlogTagDirective(Directive):
     """A directive for listing the tags."""
 
     has_content = False
+    option_spec = {'page-size': positive_int}
 
+    @timed('directive blog-post-tags', returns_nodes=True)
     def run(self):
         """Parse directive."""
         node = TagNode()
@@ -274,6 +475,7 @@ class BlogTagDirective(Directive):
         else:
             raise ValueError('Only one tag list is supported!')
         node['tags'] = []
+        note_page_size(env, node, self.options)
         return [node]
 
 
@@ -282,11 +484,15 @@ class BlogTagListDirective(Directive):
 
     has_content = False
 
+    @timed('directive blog-post-list-tags', returns_nodes=True)
     def run(self):
         """Parse directive."""
         node = TagListNode()
         env = self.state.document.settings.env
         node['docname'] = env.docname
+        if not hasattr(env, 'taglist_docnames'):
+            env.taglist_docnames = set()
+        env.taglist_docnames.add(env.docname)
         return [node]
 
 
@@ -294,7 +500,9 @@ class BlogArchiveDirective(Directive):
     """A directive for making the archive list."""
 
     has_content = False
+    option_spec = {'page-size': positive_int}
 
+    @timed('directive blog-post-archive', returns_nodes=True)
     def run(self):
         """Parse directive."""
         node = ArchiveNode()
@@ -304,30 +512,69 @@ class BlogArchiveDirective(Directive):
         else:
             raise ValueError('Only one archive list is supported!')
         node['years'] = []
+        note_page_size(env, node, self.options)
         return [node]
 
 
 class BlogRecentDirective(Directive):
-    """A directive for the recent blog posts."""
+    """A directive for the recent blog posts.
+
+    The posts can be limited to the ones with any of the given
+    `tags`, to a `category` or to an `author`. The directive can
+    be used several times, also in the same document.
+    """
 
     has_content = False
     required_arguments = 0
     optional_arguments = 0
-    option_spec = {'length': positive_int}
-
+    option_spec = {
+        'length': positive_int,
+        'tags': cvs_to_list,
+        'category': stripped,
+        'author': stripped,
+    }
+
+    @timed('directive blog-post-recent', returns_nodes=True)
     def run(self):
         """Parse directive."""
         node = RecentNode()
-        for key in self.option_spec:
-            node[key] = self.options[key]
+        env = self.state.document.settings.env
+        node['docname'] = env.docname
+        node['length'] = self.options['length']
+        node['tags'] = self.options.get('tags', [])
+        node['category'] = self.options.get('category', '')
+        node['author'] = self.options.get('author', '')
         node['items'] = []
         node['nmax'] = 0
-        env = self.state.document.settings.env
-        if not hasattr(env, 'recent_docname'):
-            env.recent_docname = env.docname
-        else:
-            raise ValueError('Recent posts can only be inserted once!')
-        if not hasattr(env, 'recent_nodes'):
-            env.recent_nodes = []
-        env.recent_nodes.append(node)
+        if not hasattr(env, 'recent_docnames'):
+            env.recent_docnames = set()
+        env.recent_docnames.add(env.docname)
+        return [node]
+
+
+class BlogPostIndexDirective(Directive):
+    """A directive for a list of posts loaded from the JSON index.
+
+    The list can be limited to a tag or a category, and is shown
+    `batch` posts at a time as the reader scrolls down.
+    """
+
+    has_content = False
+    option_spec = {
+        'tag': stripped_lower,
+        'category': stripped,
+        'batch': positive_int,
+        'no-filter': flag,
+    }
+
+    @timed('directive blog-post-index', returns_nodes=True)
+    def run(self):
+        """Parse directive."""
+        node = PostIndexNode()
+        node['docname'] = self.state.document.settings.env.docname
+        node['tag'] = self.options.get('tag', '')
+        node['category'] = self.options.get('category', '')
+        node['batch'] = self.options.get('batch', 20)
+        node['filter'] = 'no-filter' not in self.options
+        node['index_uri'] = ''
         return [node]
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Methods for writing pre-compressed copies of the generated files.
+
+For each file, a ``.gz`` file (and a ``.br`` file if the ``brotli``
+package is available) is written next to it, so that a web server
+can serve the compressed files directly, e.g. with ``gzip_static``
+in nginx. The hash of each compressed file is stored, so that files
+which have not changed since the last build are not compressed
+again.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import importlib.util
+import json
+import os
+from blogpost.fileutils import FILE_MODE, file_hash
+
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+
+def has_brotli():
+    """Return True if brotli can be imported."""
+    return importlib.util.find_spec('brotli') is not None
+
+
+def compress_formats():
+    """Return the compressed formats that can be written."""
+    return ['gz', 'br'] if has_brotli() else ['gz']
+
+
+def write_compressed(path, data):
+    """Write compressed data, replacing the file in one step."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as output:
+        output.write(data)
+    os.chmod(tmp_path, FILE_MODE)
+    os.replace(tmp_path, path)
+
+
+def compress_file(path, formats):
+    """Write the compressed copies of a file.
+
+    This is run in the worker processes.
+
+    Parameters
+    ----------
+    path : string
+        The file to compress.
+    formats : list of strings
+        The formats to write, ``'gz'`` and/or ``'br'``.
+
+    """
+    with open(path, 'rb') as infile:
+        data = infile.read()
+    if 'gz' in formats:
+        # A fixed time stamp gives the same output for the same data:
+        write_compressed(path + '.gz',
+                         gzip.compress(data, GZIP_LEVEL, mtime=0))
+    if 'br' in formats:
+        import brotli  # pylint: disable=import-outside-toplevel
+        write_compressed(path + '.br',
+                         brotli.compress(data, quality=BROTLI_QUALITY))
+
+
+class CompressionCache:
+    """The hashes of the files compressed in previous builds.
+
+    Attributes
+    ----------
+    index_file : string
+        The file storing the hashes.
+    hashes : dict of strings
+        The hash of each compressed file when it was compressed.
+    formats : list of strings
+        The formats to write.
+    compressed : integer
+        The number of files compressed in this build.
+
+    """
+
+    def __init__(self, index_file, formats):
+        """Load the stored hashes.
+
+        Parameters
+        ----------
+        index_file : string
+            The file storing the hashes.
+        formats : list of strings
+            The formats to write.
+
+        """
+        self.index_file = index_file
+        self.formats = formats
+        self.hashes = {}
+        self.compressed = 0
+        try:
+            with open(index_file, encoding='utf-8') as infile:
+                data = json.load(infile)
+        except (OSError, ValueError):
+            data = {}
+        if data.get('formats') == formats:
+            self.hashes = data.get('hashes', {})
+
+    def is_current(self, path, key):
+        """Check if the compressed copies of a file are up to date."""
+        return self.hashes.get(path) == key and all(
+            os.path.isfile('{}.{}'.format(path, fmt)) for fmt in self.formats
+        )
+
+    def update(self, paths, jobs=None):
+        """Compress the given files, unless they are unchanged.
+
+        Parameters
+        ----------
+        paths : iterable of strings
+            The files to compress.
+        jobs : integer, optional
+            The number of processes to use. If not given, one
+            process per CPU is used.
+
+        """
+        missing = {}
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            key = file_hash(path)
+            if not self.is_current(path, key):
+                missing[path] = key
+        workers = jobs or os.cpu_count() or 1
+        if workers == 1 or len(missing) < 2:
+            for path in missing:
+                compress_file(path, self.formats)
+        else:
+            chunksize = max(1, len(missing) // (4 * workers))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(compress_file, missing,
+                              [self.formats] * len(missing),
+                              chunksize=chunksize))
+        self.hashes.update(missing)
+        self.compressed += len(missing)
+
+    def save(self):
+        """Store the hashes of the compressed files."""
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        with open(self.index_file, 'w', encoding='utf-8') as output:
+            json.dump({'formats': self.formats, 'hashes': self.hashes},
+                      output)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Methods for writing Atom and RSS feeds for the blog posts.
+
+The feeds are written with a streaming XML writer, so that no
+document tree is built in memory, and a feed file is only replaced
+when its contents have changed.
+
+Note
+----
+The times of the posts are given without a time zone. In the feeds,
+they are taken to be in UTC.
+"""
+from xml.sax.saxutils import XMLGenerator
+from blogpost.fileutils import update_file
+
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+FEED_FORMATS = ('atom', 'rss')
+
+
+def atom_time(time):
+    """Format a time as required by Atom (RFC 3339), taken as UTC."""
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def rss_time(time):
+    """Format a time as required by RSS (RFC 822), taken as UTC."""
+    days = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+    months = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug',
+              'Sep', 'Oct', 'Nov', 'Dec')
+    return '{}, {:02d} {} {} GMT'.format(
+        days[time.weekday()], time.day, months[time.month - 1],
+        time.strftime('%Y %H:%M:%S'),
+    )
+
+
+def text_element(xml, name, text, attrs=None):
+    """Write an element containing only text."""
+    xml.startElement(name, attrs or {})
+    xml.characters(text)
+    xml.endElement(name)
+
+
+def empty_element(xml, name, attrs):
+    """Write an element without content."""
+    xml.startElement(name, attrs)
+    xml.endElement(name)
+
+
+def stream_atom(xml, feed, entries):
+    """Write an Atom feed.
+
+    Parameters
+    ----------
+    xml : object like :py:class:`xml.sax.saxutils.XMLGenerator`
+        The writer to use.
+    feed : dict
+        Information about the feed: `title`, `url` (of the feed
+        itself), `site_url` and `updated`.
+    entries : iterable of dicts
+        The posts in the feed. Each post is given by its `title`,
+        `url`, `time`, `author`, `category`, `tags` and `summary`.
+
+    """
+    xml.startElement('feed', {'xmlns': ATOM_NS})
+    text_element(xml, 'title', feed['title'])
+    text_element(xml, 'id', feed['url'])
+    empty_element(xml, 'link', {'rel': 'self', 'href': feed['url']})
+    empty_element(xml, 'link', {'href': feed['site_url']})
+    if feed['updated'] is not None:
+        text_element(xml, 'updated', atom_time(feed['updated']))
+    for entry in entries:
+        xml.startElement('entry', {})
+        text_element(xml, 'title', entry['title'])
+        text_element(xml, 'id', entry['url'])
+        empty_element(xml, 'link', {'href': entry['url']})
+        text_element(xml, 'published', atom_time(entry['time']))
+        text_element(xml, 'updated', atom_time(entry['time']))
+        if entry['author']:
+            xml.startElement('author', {})
+            text_element(xml, 'name', entry['author'])
+            xml.endElement('author')
+        for term in (entry['category'],) + tuple(entry['tags']):
+            if term:
+                empty_element(xml, 'category', {'term': term})
+        text_element(xml, 'summary', entry['summary'])
+        xml.endElement('entry')
+    xml.endElement('feed')
+
+
+def stream_rss(xml, feed, entries):
+    """Write a RSS 2.0 feed.
+
+    Parameters
+    ----------
+    xml : object like :py:class:`xml.sax.saxutils.XMLGenerator`
+        The writer to use.
+    feed : dict
+        Information about the feed, see :py:func:`.stream_atom`.
+    entries : iterable of dicts
+        The posts in the feed, see :py:func:`.stream_atom`.
+
+    """
+    xml.startElement('rss', {'version': '2.0'})
+    xml.startElement('channel', {})
+    text_element(xml, 'title', feed['title'])
+    text_element(xml, 'link', feed['site_url'])
+    text_element(xml, 'description', feed['title'])
+    if feed['updated'] is not None:
+        text_element(xml, 'lastBuildDate', rss_time(feed['updated']))
+    for entry in entries:
+        xml.startElement('item', {})
+        text_element(xml, 'title', entry['title'])
+        text_element(xml, 'link', entry['url'])
+        text_element(xml, 'guid', entry['url'])
+        text_element(xml, 'pubDate', rss_time(entry['time']))
+        for term in (entry['category'],) + tuple(entry['tags']):
+            if term:
+                text_element(xml, 'category', term)
+        text_element(xml, 'description', entry['summary'])
+        xml.endElement('item')
+    xml.endElement('channel')
+    xml.endElement('rss')
+
+
+def write_feed(path, feed, entries, fmt='atom'):
+    """Write a feed to a file, unless the file is already up to date.
+
+    The feed is streamed to a temporary file which then replaces
+    the existing feed only if the two differ.
+
+    Parameters
+    ----------
+    path : string
+        The file to write the feed to.
+    feed : dict
+        Information about the feed, see :py:func:`.stream_atom`.
+    entries : iterable of dicts
+        The posts in the feed, see :py:func:`.stream_atom`.
+    fmt : string, optional
+        The format of the feed, ``'atom'`` or ``'rss'``.
+
+    Returns
+    -------
+    out : boolean
+        True if the file was written, False if it was unchanged.
+
+    """
+    if fmt not in FEED_FORMATS:
+        raise ValueError('Unknown feed format "{}"'.format(fmt))
+
+    def write(output):
+        """Stream the feed to the given file."""
+        xml = XMLGenerator(output, encoding='utf-8',
+                           short_empty_elements=True)
+        xml.startDocument()
+        if fmt == 'atom':
+            stream_atom(xml, feed, entries)
+        else:
+            stream_rss(xml, feed, entries)
+        xml.endDocument()
+
+    return update_file(path, write)
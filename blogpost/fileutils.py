@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Methods for writing the extra files created by the extension."""
+import filecmp
+import hashlib
+import os
+import tempfile
+
+
+FILE_MODE = 0o644
+
+
+def update_file(path, write):
+    """Write a file, unless the file is already up to date.
+
+    The contents are streamed to a temporary file which then
+    replaces the existing file only if the two differ. Keeping
+    unchanged files untouched means that their time stamps are
+    kept, which is useful for incremental uploads of the site.
+
+    Parameters
+    ----------
+    path : string
+        The file to write.
+    write : callable
+        Called with the opened (text) file as its only argument
+        to write the contents.
+
+    Returns
+    -------
+    out : boolean
+        True if the file was written, False if it was unchanged.
+
+    """
+    dirname = os.path.dirname(path)
+    os.makedirs(dirname, exist_ok=True)
+    handle, tmp_path = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'w', encoding='utf-8') as output:
+            write(output)
+        if os.path.isfile(path) and filecmp.cmp(tmp_path, path,
+                                                shallow=False):
+            os.remove(tmp_path)
+            return False
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
+def file_hash(path):
+    """Return a hash of the contents of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:20]
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Optional timers and counters for the work done by the extension.
+
+The instrumentation is switched on with the ``blog_instrumentation``
+configuration value. When it is off, the timed functions are called
+directly and the counters are not updated, so the only cost is the
+check of :py:attr:`.Instrumentation.enabled`.
+
+Note
+----
+The measurements are kept in the process doing the work. In a
+parallel build (``sphinx-build -j N``) the documents read or
+written by the worker processes are therefore not included.
+"""
+import functools
+import json
+import time
+
+
+class Instrumentation:
+    """Timers and counters for a build.
+
+    Attributes
+    ----------
+    enabled : boolean
+        True if measurements should be recorded.
+    timers : dict of lists
+        For each timer, the number of calls and the total time.
+    counters : dict of integers
+        The value of each counter.
+    pages : dict of integers
+        The number of bytes in the body of each listing page.
+
+    """
+
+    def __init__(self):
+        """Start with instrumentation turned off."""
+        self.enabled = False
+        self.timers = {}
+        self.counters = {}
+        self.pages = {}
+
+    def reset(self, enabled):
+        """Remove all measurements and turn instrumentation on or off."""
+        self.enabled = enabled
+        self.timers = {}
+        self.counters = {}
+        self.pages = {}
+
+    def add_time(self, name, seconds):
+        """Add a call taking the given time to a timer."""
+        timer = self.timers.setdefault(name, [0, 0.0])
+        timer[0] += 1
+        timer[1] += seconds
+
+    def count(self, name, number=1):
+        """Increase a counter."""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + number
+
+    def note_page(self, pagename, body):
+        """Store the size of the body of a listing page."""
+        if self.enabled:
+            self.pages[pagename] = len(body.encode('utf-8'))
+
+    def report(self):
+        """Return the measurements as a dict which can be saved as JSON."""
+        return {
+            'timers': {
+                name: {'calls': calls, 'seconds': seconds}
+                for name, (calls, seconds) in sorted(self.timers.items())
+            },
+            'counters': dict(sorted(self.counters.items())),
+            'listing_pages': dict(sorted(self.pages.items())),
+        }
+
+    def summary(self):
+        """Return a one-line summary of the measurements."""
+        total = sum(seconds for _, seconds in self.timers.values())
+        slowest = sorted(self.timers.items(), key=lambda x: x[1][1],
+                         reverse=True)[:3]
+        slowest = ', '.join(
+            '{} {:.3f} s ({} calls)'.format(name, seconds, calls)
+            for name, (calls, seconds) in slowest
+        )
+        return '{:.3f} s in total, slowest: {}; {} listing pages, ' \
+            '{} bytes'.format(total, slowest or 'none', len(self.pages),
+                              sum(self.pages.values()))
+
+    def write_report(self, path, extra=None):
+        """Write the measurements as JSON.
+
+        Parameters
+        ----------
+        path : string
+            The file to write to.
+        extra : dict, optional
+            More information to add to the report.
+
+        """
+        report = self.report()
+        report.update(extra or {})
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+            output.write('\n')
+
+
+STATS = Instrumentation()
+
+
+def count_nodes(node_list):
+    """Count the given nodes, and their children, as created."""
+    if STATS.enabled:
+        STATS.count(
+            'nodes_created',
+            sum(sum(1 for _ in node.traverse()) for node in node_list),
+        )
+
+
+def timed(name, returns_nodes=False):
+    """Return a decorator recording the time used by a function.
+
+    Parameters
+    ----------
+    name : string
+        The name of the timer.
+    returns_nodes : boolean, optional
+        If True, the function returns a list of new nodes (as the
+        ``run`` method of a directive) which are counted.
+
+    """
+    def decorator(function):
+        """Wrap the function with the timer."""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            """Call the function, recording the time if enabled."""
+            if not STATS.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                STATS.add_time(name, time.perf_counter() - start)
+            if returns_nodes:
+                count_nodes(result)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Methods for writing a JSON index of the blog posts.
+
+The index is split into one shard per year, so that a browser only
+fetches the years it shows, and a small manifest describing the
+shards. The shards are streamed one post at a time and, as for the
+feeds, files with unchanged contents are not rewritten.
+"""
+import json
+import os
+from blogpost.fileutils import update_file
+
+
+MANIFEST = 'index.json'
+
+
+def dump(obj):
+    """Return compact JSON for an object."""
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def shard_name(year):
+    """Return the file name of the shard for a year."""
+    return '{}.json'.format(year)
+
+
+def write_shard(path, entries):
+    """Write the posts of a shard as a JSON list.
+
+    Parameters
+    ----------
+    path : string
+        The file to write the shard to.
+    entries : iterable of dicts
+        The posts in the shard. Each post is given by its `title`,
+        `time`, `category`, `tags`, `summary` and `url`.
+
+    Returns
+    -------
+    out : boolean
+        True if the file was written, False if it was unchanged.
+
+    """
+    def write(output):
+        """Stream the posts to the given file."""
+        output.write('[')
+        for i, entry in enumerate(entries):
+            if i > 0:
+                output.write(',\n')
+            output.write(dump(entry))
+        output.write(']\n')
+
+    return update_file(path, write)
+
+
+def make_manifest(base, archive):
+    """Return the manifest describing the shards.
+
+    Parameters
+    ----------
+    base : string
+        The root of the site, relative to the manifest. The urls
+        of the posts in the shards are relative to this.
+    archive : dict of lists
+        For each year, the posts from that year.
+
+    Returns
+    -------
+    out : dict
+        The manifest. The shards are listed with the newest year
+        first, together with the number of posts, and the
+        categories and tags used in that year so that shards
+        without matches can be skipped when filtering.
+
+    """
+    shards = []
+    for year in sorted(archive, reverse=True):
+        posts = archive[year]
+        shards.append(
+            {
+                'year': year,
+                'file': shard_name(year),
+                'count': len(posts),
+                'categories': sorted({post.category for post in posts}),
+                'tags': sorted({tag for post in posts for tag in post.tags}),
+            }
+        )
+    return {'base': base, 'shards': shards}
+
+
+def write_index(directory, base, archive, make_entry):
+    """Write the manifest and a shard for each year.
+
+    Parameters
+    ----------
+    directory : string
+        The directory to write the index to.
+    base : string
+        The root of the site, relative to `directory`.
+    archive : dict of lists
+        For each year, the posts from that year, newest first.
+    make_entry : callable
+        Returns the information stored for a post, see
+        :py:func:`.write_shard`.
+
+    Returns
+    -------
+    out : tuple of integers
+        The number of files written and the total number of files.
+
+    """
+    written = 0
+    for year, posts in archive.items():
+        written += write_shard(
+            os.path.join(directory, shard_name(year)),
+            (make_entry(post) for post in posts),
+        )
+    manifest = make_manifest(base, archive)
+    written += update_file(
+        os.path.join(directory, MANIFEST),
+        lambda output: output.write(dump(manifest) + '\n'),
+    )
+    return written, len(archive) + 1
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""A SQLite database with the metadata of the posts.
+
+The database is written to the build directory for use by other
+tools, the extension itself never reads the posts back from it (it
+is export-only). It contains the tables:
+
+* ``sources``: The `docname`, `path` (relative to the source
+  directory), `mtime` and `hash` of the source file of each
+  document.
+* ``posts``: The items of :py:data:`.BLOG_ITEMS` (except the tags)
+  together with the `docname` and `targetid` of each post. The
+  `time` is stored as ``YYYY-MM-DDTHH:MM:SS`` so that it can be
+  compared as text.
+* ``tags``: The `tag`\\s of each post, with their `position`.
+
+Example
+-------
+The posts tagged with ``python`` from 2018::
+
+    SELECT posts.* FROM posts JOIN tags USING (docname, targetid)
+    WHERE tag = 'python' AND time >= '2018' AND time < '2019'
+    ORDER BY time DESC;
+
+or, using :py:func:`.query_posts`::
+
+    query_posts('_build/doctrees/blogpost-metadata.sqlite',
+                tag='python', start='2018', end='2019')
+
+"""
+from datetime import datetime
+import os
+import sqlite3
+from urllib.request import pathname2url
+from blogpost.blogpostdirective import BLOG_ITEMS, PostRecord
+from blogpost.fileutils import file_hash
+from blogpost.postindex import sort_key
+
+
+DATABASE = 'blogpost-metadata.sqlite'
+SCHEMA_VERSION = 1
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+COLUMNS = tuple(key for key in BLOG_ITEMS if key != 'tags')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sources (
+    docname TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS posts (
+    docname TEXT NOT NULL,
+    targetid TEXT NOT NULL,
+    {columns},
+    PRIMARY KEY (docname, targetid)
+);
+CREATE TABLE IF NOT EXISTS tags (
+    docname TEXT NOT NULL,
+    targetid TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (docname, targetid, position)
+);
+CREATE INDEX IF NOT EXISTS posts_time ON posts (time);
+CREATE INDEX IF NOT EXISTS posts_category ON posts (category);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);
+'''.format(columns=',\n    '.join('{} TEXT'.format(i) for i in COLUMNS))
+
+
+def post_row(post):
+    """Return the values stored in the ``posts`` table for a post."""
+    row = [post.docname, post.targetid]
+    for key in COLUMNS:
+        value = getattr(post, key)
+        if key == 'time':
+            value = value.strftime(TIME_FORMAT)
+        row.append(value)
+    return row
+
+
+def make_record(row, tags):
+    """Create a post record from the stored values.
+
+    Parameters
+    ----------
+    row : object like :py:class:`sqlite3.Row`
+        A row of the ``posts`` table.
+    tags : list of strings
+        The tags of the post.
+
+    Returns
+    -------
+    out : object like :py:class:`.PostRecord`
+        The post.
+
+    """
+    fields = {key: row[key] for key in COLUMNS}
+    fields['time'] = datetime.strptime(fields['time'], TIME_FORMAT)
+    fields['tags'] = tuple(tags)
+    return PostRecord(docname=row['docname'], targetid=row['targetid'],
+                      **fields)
+
+
+class PostDatabase:
+    """The stored metadata of the posts.
+
+    Attributes
+    ----------
+    path : string
+        The path to the database file.
+    connection : object like :py:class:`sqlite3.Connection`
+        The connection to the database.
+
+    """
+
+    def __init__(self, path, readonly=False):
+        """Open the database, creating it if needed.
+
+        A database with an older layout is emptied.
+
+        Parameters
+        ----------
+        path : string
+            The path to the database file.
+        readonly : boolean, optional
+            If True, the database is opened read-only. It is then
+            never created or changed, and opening it fails if it
+            does not exist or has a different layout.
+
+        Raises
+        ------
+        sqlite3.OperationalError
+            If a read-only database does not exist.
+        ValueError
+            If a read-only database has a different layout.
+
+        """
+        self.path = path
+        if readonly:
+            uri = 'file:{}?mode=ro'.format(pathname2url(os.path.abspath(path)))
+            self.connection = sqlite3.connect(uri, uri=True)
+        else:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        version = self.connection.execute('PRAGMA user_version').fetchone()
+        if readonly:
+            if version[0] != SCHEMA_VERSION:
+                self.connection.close()
+                raise ValueError(
+                    'The post database {} has version {}, expected {}'.format(
+                        path, version[0], SCHEMA_VERSION
+                    )
+                )
+            return
+        with self.connection:
+            if version[0] != SCHEMA_VERSION:
+                self.connection.executescript(
+                    'DROP TABLE IF EXISTS sources; '
+                    'DROP TABLE IF EXISTS posts; '
+                    'DROP TABLE IF EXISTS tags;'
+                )
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(
+                'PRAGMA user_version = {}'.format(SCHEMA_VERSION)
+            )
+
+    def close(self):
+        """Close the connection to the database."""
+        self.connection.close()
+
+    def source_state(self, docname, path):
+        """Return the modification time and hash of a source file.
+
+        The file is only read if its modification time differs from
+        the stored one.
+
+        Parameters
+        ----------
+        docname : string
+            The document the file is the source of.
+        path : string
+            The path to the file.
+
+        Returns
+        -------
+        out : tuple of float and string, or None
+            The `mtime` and `hash` of the file, or None if the
+            file can not be read.
+
+        """
+        try:
+            mtime = os.stat(path).st_mtime
+            row = self.connection.execute(
+                'SELECT mtime, hash FROM sources WHERE docname = ?',
+                (docname,),
+            ).fetchone()
+            if row is not None and row['mtime'] == mtime:
+                return mtime, row['hash']
+            return mtime, file_hash(path)
+        except OSError:
+            return None
+
+    def load(self, docnames=None):
+        """Return the stored posts.
+
+        This is meant for other tools reading the database, see
+        also :py:func:`.query_posts`.
+
+        Parameters
+        ----------
+        docnames : iterable of strings, optional
+            Only return the posts of these documents. If not given,
+            all posts are returned.
+
+        Returns
+        -------
+        out : list of objects like :py:class:`.PostRecord`
+            The posts, ordered by document and target id.
+
+        """
+        return self.select('', (), docnames=docnames)
+
+    def select(self, where, parameters, docnames=None):
+        """Return the posts matching a condition on the posts table."""
+        sql = 'SELECT * FROM posts'
+        if where:
+            sql += ' WHERE ' + where
+        rows = self.connection.execute(
+            sql + ' ORDER BY docname, targetid', parameters
+        ).fetchall()
+        if docnames is not None:
+            docnames = set(docnames)
+            rows = [row for row in rows if row['docname'] in docnames]
+        tags = {}
+        for row in self.connection.execute(
+                'SELECT docname, targetid, tag FROM tags ORDER BY position'
+        ):
+            tags.setdefault((row['docname'], row['targetid']),
+                            []).append(row['tag'])
+        return [
+            make_record(row, tags.get((row['docname'], row['targetid']), []))
+            for row in rows
+        ]
+
+    def update(self, srcdir, sources, posts, docnames):
+        """Store the posts of the given documents.
+
+        Parameters
+        ----------
+        srcdir : string
+            The source directory, the paths are stored relative
+            to this directory.
+        sources : dict of strings
+            The path to the source file of each document.
+        posts : list of objects like :py:class:`.PostRecord`
+            The posts of the documents.
+        docnames : iterable of strings
+            The documents to update. Documents in `sources` which
+            are not stored yet are also added, and the stored
+            information for documents not in `sources` is removed.
+
+        Returns
+        -------
+        out : integer
+            The number of documents updated.
+
+        """
+        by_doc = {}
+        for post in posts:
+            by_doc.setdefault(post.docname, []).append(post)
+        updated = 0
+        with self.connection:
+            stored = [
+                row[0] for row in
+                self.connection.execute('SELECT docname FROM sources')
+            ]
+            refresh = set(docnames) | set(sources).symmetric_difference(
+                stored
+            )
+            for docname in sorted(refresh):
+                self.remove(docname)
+                state = None
+                if docname in sources:
+                    state = self.source_state(docname, sources[docname])
+                if state is None:
+                    continue
+                path = os.path.relpath(sources[docname], srcdir)
+                self.connection.execute(
+                    'INSERT INTO sources VALUES (?, ?, ?, ?)',
+                    (docname, path.replace(os.sep, '/')) + state,
+                )
+                for post in by_doc.get(docname, []):
+                    self.insert(post)
+                updated += 1
+        return updated
+
+    def remove(self, docname):
+        """Remove the stored information about a document."""
+        for table in ('sources', 'posts', 'tags'):
+            self.connection.execute(
+                'DELETE FROM {} WHERE docname = ?'.format(table), (docname,)
+            )
+
+    def insert(self, post):
+        """Store a post."""
+        row = post_row(post)
+        self.connection.execute(
+            'INSERT INTO posts VALUES ({})'.format(', '.join('?' * len(row))),
+            row,
+        )
+        self.connection.executemany(
+            'INSERT INTO tags VALUES (?, ?, ?, ?)',
+            [(post.docname, post.targetid, i, tag)
+             for i, tag in enumerate(post.tags)],
+        )
+
+
+def query_posts(path, tag=None, category=None, start=None, end=None):
+    """Return the posts stored in a database, filtered and sorted.
+
+    Parameters
+    ----------
+    path : string
+        The path to the database file.
+    tag : string, optional
+        Only return the posts with this tag.
+    category : string, optional
+        Only return the posts in this category.
+    start : string, optional
+        Only return the posts from this time (inclusive) and
+        later, e.g. ``'2018-06'``.
+    end : string, optional
+        Only return the posts before this time (exclusive).
+
+    Returns
+    -------
+    out : list of objects like :py:class:`.PostRecord`
+        The posts, with the newest first.
+
+    Raises
+    ------
+    sqlite3.OperationalError
+        If the database does not exist.
+    ValueError
+        If the database was written by a different version of the
+        extension.
+
+    Note
+    ----
+    The database is opened read-only and it is never modified.
+
+    """
+    where, parameters = [], []
+    if tag is not None:
+        where.append('EXISTS (SELECT 1 FROM tags WHERE '
+                     'tags.docname = posts.docname AND '
+                     'tags.targetid = posts.targetid AND tag = ?)')
+        parameters.append(tag)
+    if category is not None:
+        where.append('category = ?')
+        parameters.append(category)
+    if start is not None:
+        where.append('time >= ?')
+        parameters.append(start)
+    if end is not None:
+        where.append('time < ?')
+        parameters.append(end)
+    database = PostDatabase(path, readonly=True)
+    try:
+        posts = database.select(' AND '.join(where), parameters)
+    finally:
+        database.close()
+    return sorted(posts, key=sort_key, reverse=True)
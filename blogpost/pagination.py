@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Methods for splitting the lists of posts into several pages."""
+
+
+def paginate(groups, keys, page_size=None):
+    """Split grouped posts into pages.
+
+    The posts are distributed on the pages in the order given by
+    `keys`, and a group is continued on the next page when it does
+    not fit on the current one.
+
+    Parameters
+    ----------
+    groups : dict of lists
+        The grouped posts, e.g. the posts for each tag.
+    keys : list of strings
+        The groups to include, in the order they will be shown.
+    page_size : integer, optional
+        The maximum number of posts on a page. If not given, all
+        posts are put on a single page.
+
+    Returns
+    -------
+    out : list of lists of tuples
+        For each page, the groups on the page as tuples of the
+        group key and the posts of that group on the page.
+
+    """
+    if not page_size:
+        return [[(key, groups[key]) for key in keys]]
+    pages = [[]]
+    room = page_size
+    for key in keys:
+        posts = groups[key]
+        start = 0
+        while start < len(posts):
+            if room == 0:
+                pages.append([])
+                room = page_size
+            chunk = posts[start:start + room]
+            pages[-1].append((key, chunk))
+            start += len(chunk)
+            room -= len(chunk)
+    return pages
+
+
+def first_pages(pages):
+    """Return the page where each group starts.
+
+    Parameters
+    ----------
+    pages : list of lists of tuples
+        The pages, as given by :py:func:`.paginate`.
+
+    Returns
+    -------
+    out : dict of integers
+        The (zero-based) number of the first page for each group.
+
+    """
+    first = {}
+    for number, page in enumerate(pages):
+        for key, _ in page:
+            first.setdefault(key, number)
+    return first
+
+
+def page_name(docname, number):
+    """Return the name of a page in a paginated listing.
+
+    Parameters
+    ----------
+    docname : string
+        The document containing the listing.
+    number : integer
+        The (zero-based) number of the page.
+
+    Returns
+    -------
+    out : string
+        The name of the page. The first page is the document itself.
+
+    """
+    if number == 0:
+        return docname
+    return '{}-page-{}'.format(docname, number + 1)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""An index of the blog posts, built once per build."""
+import heapq
+import itertools
+from blogpost.blogpostdirective import unique_slugs
+
+
+def post_key(post):
+    """Return the key identifying a post.
+
+    The target ids are only unique within a document, so
+    the document name is also needed.
+    """
+    return (post.docname, post.targetid)
+
+
+def sort_key(post):
+    """Return the key used for sorting posts.
+
+    Posts with the same time are ordered on their document name and
+    target id, so that the order does not depend on the order in
+    which the documents were read.
+    """
+    return (post.time, post.docname, post.targetid)
+
+
+class PostIndex:
+    """Posts sorted on time and grouped on category, tag and year.
+
+    The index is created once after all documents have been read
+    so that the documents being resolved can look up the posts
+    without walking and sorting ``env.blog_posts`` each time.
+
+    Attributes
+    ----------
+    posts : list of objects like :py:class:`.PostRecord`
+        All posts, sorted on time with the newest post first, see
+        :py:func:`.sort_key`.
+    categories : dict of lists
+        For each category, the posts labeled with the category.
+    tags : dict of lists
+        For each tag, the posts labeled with the tag.
+    archive : dict of lists
+        For each year, the posts from that year.
+    authors : dict of lists
+        For each author, the posts by that author.
+    position : dict of integers
+        The position of each post in `posts`, keyed on the
+        document name and the target id of the post.
+    slugs : dict of dicts
+        For ``'category'`` and ``'tag'``, the unique slug of each
+        category and tag, used in the names of generated files.
+    ids : dict of dicts
+        For ``'category'``, ``'tag'`` and ``'year'``, the id of the
+        section for each category, tag and year in the listings,
+        e.g. ``tag-python`` and ``year-2018``.
+
+    Note
+    ----
+    The lists in `categories`, `tags`, `archive` and `authors`
+    are all sorted on time, with the newest post first.
+
+    """
+
+    def __init__(self, all_posts):
+        """Set up the index from the given posts.
+
+        Parameters
+        ----------
+        all_posts : list of objects like :py:class:`.PostRecord`
+            The posts as stored by :py:class:`.BlogPostDirective`.
+
+        """
+        self.posts = sorted(all_posts, key=sort_key, reverse=True)
+        self.categories = {}
+        self.tags = {}
+        self.archive = {}
+        self.authors = {}
+        self.position = {}
+        for i, post in enumerate(self.posts):
+            self.position[post_key(post)] = i
+            self.categories.setdefault(post.category, []).append(post)
+            for tag in post.tags:
+                self.tags.setdefault(tag, []).append(post)
+            self.archive.setdefault(post.year, []).append(post)
+            self.authors.setdefault(post.author, []).append(post)
+        self.slugs = {
+            'category': unique_slugs(self.categories),
+            'tag': unique_slugs(self.tags),
+        }
+        self.ids = {
+            kind: {
+                key: '{}-{}'.format(kind, slug)
+                for key, slug in self.slugs[kind].items()
+            } for kind in ('category', 'tag')
+        }
+        self.ids['year'] = {
+            year: 'year-{}'.format(year) for year in self.archive
+        }
+
+    def neighbour_docnames(self, posts):
+        """Return the documents linking to the given posts.
+
+        The next/prev navigation wraps around, so the oldest and the
+        newest posts are also neighbours.
+
+        Parameters
+        ----------
+        posts : iterable of objects like :py:class:`.PostRecord`
+            The posts we are finding the neighbours for. These
+            must be posts stored in this index.
+
+        Returns
+        -------
+        out : set of strings
+            The documents containing the previous and next posts.
+
+        """
+        npost = len(self.posts)
+        docnames = set()
+        for post in posts:
+            i = self.position[post_key(post)]
+            docnames.add(self.posts[(i - 1) % npost].docname)
+            docnames.add(self.posts[(i + 1) % npost].docname)
+        return docnames
+
+    def recent(self, length, tags=(), category='', author=''):
+        """Return the most recent posts matching the given filters.
+
+        The posts are selected from the shortest of the (already
+        sorted) lists for the filters. For several tags, the lists
+        for the tags are merged with a heap. Only the posts up to
+        the `length` first matching ones are looked at.
+
+        Parameters
+        ----------
+        length : integer
+            The maximum number of posts to return.
+        tags : iterable of strings, optional
+            If given, only posts with at least one of these tags
+            are returned.
+        category : string, optional
+            If given, only posts in this category are returned.
+        author : string, optional
+            If given, only posts by this author are returned.
+
+        Returns
+        -------
+        out : list of objects like :py:class:`.PostRecord`
+            The posts, with the newest first.
+
+        """
+        tags = set(tags)
+        candidates = [(len(self.posts), self.posts)]
+        if tags:
+            lists = [self.tags.get(tag, []) for tag in tags]
+            if len(lists) == 1:
+                candidates.append((len(lists[0]), lists[0]))
+            else:
+                candidates.append((
+                    sum(len(i) for i in lists),
+                    self.merge(lists),
+                ))
+        if category:
+            posts = self.categories.get(category, [])
+            candidates.append((len(posts), posts))
+        if author:
+            posts = self.authors.get(author, [])
+            candidates.append((len(posts), posts))
+        posts = min(candidates, key=lambda x: x[0])[1]
+        selected = (
+            post for post in posts
+            if (not tags or tags.intersection(post.tags)) and
+            (not category or post.category == category) and
+            (not author or post.author == author)
+        )
+        return list(itertools.islice(selected, length))
+
+    def merge(self, lists):
+        """Merge sorted lists of posts, skipping duplicates."""
+        previous = None
+        for post in heapq.merge(
+                *lists, key=lambda x: self.position[post_key(x)]
+        ):
+            if post is not previous:
+                yield post
+            previous = post
+
+    def __len__(self):
+        """Return the number of posts in the index."""
+        return len(self.posts)
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Methods for finding related posts from shared tags and categories.
+
+Two posts are related if they share at least one tag. Their score is
+the sum of the weights of the tags they share, plus the weight of
+their category if it is the same, so that the category only raises
+the score of posts which are already related. The weight of a tag
+(or category) is ``1 / log(1 + n)`` where ``n`` is the number of
+posts with the tag, so that rare tags count more. Since a weight only
+depends on the posts with that tag, a change to a post only affects
+the scores of posts sharing a tag or the category with it, and only
+these have to be scored again.
+
+The posts to compare with are found from the lists of posts for each
+tag in :py:class:`.PostIndex`, which act as an inverted index. If
+SciPy is available, many posts are scored at once with products of
+sparse matrices instead.
+"""
+import importlib.util
+import math
+from blogpost.postindex import post_key
+
+
+SPARSE_MIN_POSTS = 500
+SPARSE_BLOCK = 256
+# Scores are rounded before they are compared so that the two
+# methods rank posts with equal scores in the same way:
+DECIMALS = 9
+
+
+def has_scipy():
+    """Return True if SciPy can be imported."""
+    return importlib.util.find_spec('scipy') is not None
+
+
+def group_weight(posts):
+    """Return the weight of a tag or category with the given posts."""
+    return 1.0 / math.log(1 + len(posts))
+
+
+def rank(scores, position, length):
+    """Return the positions of the best scoring posts.
+
+    Parameters
+    ----------
+    scores : dict of floats
+        The score for each post, keyed on its position in the index.
+    position : integer
+        The position of the post we are ranking for, which is
+        excluded.
+    length : integer
+        The maximum number of posts to return.
+
+    Returns
+    -------
+    out : list of integers
+        The positions, with the best score first. Posts with equal
+        scores are ordered with the newest first.
+
+    """
+    scores.pop(position, None)
+    ranked = sorted(
+        (-round(score, DECIMALS), i) for i, score in scores.items()
+        if score > 0
+    )
+    return [i for _, i in ranked[:length]]
+
+
+def score_python(index, positions, length):
+    """Find the related posts using the inverted index.
+
+    Only the posts sharing a tag with a post are scored for it, and
+    the weight of the category is added to the ones in the same
+    category.
+
+    Parameters
+    ----------
+    index : object like :py:class:`.PostIndex`
+        The index of all posts.
+    positions : list of integers
+        The positions of the posts to find related posts for.
+    length : integer
+        The number of related posts to find for each post.
+
+    Returns
+    -------
+    out : dict of lists
+        For each of the given positions, the positions of the
+        related posts.
+
+    """
+    tags = {
+        tag: (group_weight(posts),
+              [index.position[post_key(i)] for i in posts])
+        for tag, posts in index.tags.items()
+    }
+    categories = {
+        category: group_weight(posts)
+        for category, posts in index.categories.items()
+    }
+    related = {}
+    for position in positions:
+        post = index.posts[position]
+        scores = {}
+        for tag in post.tags:
+            weight, others = tags[tag]
+            for i in others:
+                scores[i] = scores.get(i, 0.0) + weight
+        weight = categories[post.category]
+        for i in scores:
+            if index.posts[i].category == post.category:
+                scores[i] += weight
+        related[position] = rank(scores, position, length)
+    return related
+
+
+def score_sparse(index, positions, length):
+    """Find the related posts with SciPy, see :py:func:`.score_python`.
+
+    The posts are represented by the rows of a sparse matrix with
+    the tags of each post. The products of the weighted rows for a
+    block of posts with the matrix for all posts give the tag scores
+    of the posts sharing a tag, to which the category weights are
+    added. The best posts are then selected for each row.
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+    from scipy import sparse
+    columns = {tag: i for i, tag in enumerate(index.tags)}
+    weights = np.array([group_weight(i) for i in index.tags.values()])
+    categories = {key: i for i, key in enumerate(index.categories)}
+    category_weights = np.array(
+        [group_weight(i) for i in index.categories.values()]
+    )
+    category = np.array([categories[i.category] for i in index.posts])
+    rows, cols = [], []
+    for i, post in enumerate(index.posts):
+        for tag in post.tags:
+            rows.append(i)
+            cols.append(columns[tag])
+    features = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, cols)),
+        shape=(len(index.posts), len(columns)),
+    )
+    weighted = features @ sparse.diags(weights)
+    features_t = features.T.tocsr()
+    related = {}
+    for start in range(0, len(positions), SPARSE_BLOCK):
+        block = positions[start:start + SPARSE_BLOCK]
+        scores = (weighted[block] @ features_t).tocsr()
+        for row, position in enumerate(block):
+            begin, end = scores.indptr[row], scores.indptr[row + 1]
+            candidates = scores.indices[begin:end]
+            values = scores.data[begin:end].copy()
+            same = category[candidates] == category[position]
+            values[same] += category_weights[category[position]]
+            keep = (candidates != position) & (values > 0)
+            candidates = candidates[keep]
+            values = np.round(values[keep], DECIMALS)
+            if len(candidates) > length:
+                best = np.argpartition(-values, length - 1)[:length]
+                # Keep all posts tied with the last one, the ties are
+                # broken on the position below:
+                keep = values >= values[best].min()
+                candidates, values = candidates[keep], values[keep]
+            order = np.lexsort((candidates, -values))
+            related[position] = [int(i) for i in candidates[order][:length]]
+    return related
+
+
+def related_posts(index, posts, length):
+    """Find the related posts for the given posts.
+
+    Parameters
+    ----------
+    index : object like :py:class:`.PostIndex`
+        The index of all posts.
+    posts : iterable of objects like :py:class:`.PostRecord`
+        The posts to find related posts for.
+    length : integer
+        The number of related posts to find for each post.
+
+    Returns
+    -------
+    out : dict of tuples
+        For each of the given posts, the keys (document name and
+        target id) of the related posts, the most related first.
+
+    """
+    positions = sorted(index.position[post_key(post)] for post in posts)
+    if len(positions) >= SPARSE_MIN_POSTS and has_scipy():
+        related = score_sparse(index, positions, length)
+    else:
+        related = score_python(index, positions, length)
+    return {
+        post_key(index.posts[position]): tuple(
+            post_key(index.posts[i]) for i in others
+        )
+        for position, others in related.items()
+    }
+
+
+def affected_posts(index, changed):
+    """Return the posts whose related posts may have changed.
+
+    Parameters
+    ----------
+    index : object like :py:class:`.PostIndex`
+        The index of all posts.
+    changed : iterable of objects like :py:class:`.PostRecord`
+        The posts that were added, modified or removed (both the old
+        and new versions of modified posts).
+
+    Returns
+    -------
+    out : set of objects like :py:class:`.PostRecord`
+        The posts of the index sharing a tag or the category with
+        any of the changed posts.
+
+    """
+    affected = set()
+    for post in changed:
+        for tag in post.tags:
+            affected.update(index.tags.get(tag, ()))
+        affected.update(index.categories.get(post.category, ()))
+    return affected
@@ -0,0 +1,187 @@
+/*
+ * blogpost-index.js
+ * ~~~~~~~~~~~~~~~~~
+ *
+ * Filtering and infinite scroll for the lists made by the
+ * blog-post-index directive. The posts are loaded from the JSON
+ * index written by the blogpost extension, one year at a time.
+ *
+ * :copyright: Copyright 2018, Anders Lervik.
+ * :license: LGPLv2.1+. See LICENSE for more info.
+ */
+(function () {
+  'use strict';
+
+  function matchesOptions(post, options) {
+    if (options.tag && post.tags.indexOf(options.tag) < 0) {
+      return false;
+    }
+    return !(options.category && post.category !== options.category);
+  }
+
+  function matchesQuery(post, query) {
+    if (!query) {
+      return true;
+    }
+    var text = [post.title, post.summary, post.category]
+      .concat(post.tags).join(' ').toLowerCase();
+    return text.indexOf(query) >= 0;
+  }
+
+  function usefulShard(shard, options) {
+    if (options.tag && shard.tags.indexOf(options.tag) < 0) {
+      return false;
+    }
+    return !(options.category &&
+             shard.categories.indexOf(options.category) < 0);
+  }
+
+  function renderPost(post, base) {
+    var item = document.createElement('li');
+    var para = document.createElement('p');
+    var link = document.createElement('a');
+    var muted = document.createElement('span');
+    var time = document.createElement('time');
+    var summary = document.createElement('em');
+    link.href = new URL(post.url, base).href;
+    link.textContent = ' ' + post.title;
+    muted.className = 'text-muted';
+    time.className = 'timeago';
+    time.setAttribute('datetime', post.time);
+    time.textContent = ' ' + post.time.replace('T', ' ');
+    muted.appendChild(document.createTextNode(' / '));
+    muted.appendChild(time);
+    summary.textContent = post.summary;
+    para.appendChild(link);
+    para.appendChild(muted);
+    para.appendChild(document.createElement('br'));
+    para.appendChild(summary);
+    item.appendChild(para);
+    return item;
+  }
+
+  function PostList(element) {
+    this.list = element.querySelector('.blogpost-index-posts');
+    this.filter = element.querySelector('.blogpost-index-filter');
+    this.more = element.querySelector('.blogpost-index-more');
+    this.options = {
+      tag: element.getAttribute('data-tag'),
+      category: element.getAttribute('data-category')
+    };
+    this.batch = parseInt(element.getAttribute('data-batch'), 10) || 20;
+    this.indexUrl = new URL(element.getAttribute('data-index'),
+                            document.baseURI);
+    this.shards = {};
+    this.generation = 0;
+    this.visible = false;
+  }
+
+  PostList.prototype.fetchJSON = function (url) {
+    return fetch(url).then(function (response) {
+      if (!response.ok) {
+        throw new Error('Could not load ' + url);
+      }
+      return response.json();
+    });
+  };
+
+  PostList.prototype.loadShard = function (shard) {
+    if (!this.shards[shard.file]) {
+      this.shards[shard.file] = this.fetchJSON(
+        new URL(shard.file, this.indexUrl).href
+      );
+    }
+    return this.shards[shard.file];
+  };
+
+  PostList.prototype.start = function () {
+    var self = this;
+    this.fetchJSON(this.indexUrl.href).then(function (manifest) {
+      self.base = new URL(manifest.base, self.indexUrl).href;
+      self.manifest = manifest.shards.filter(function (shard) {
+        return usefulShard(shard, self.options);
+      });
+      self.reset('');
+      if (self.filter) {
+        var timer = null;
+        self.filter.addEventListener('input', function () {
+          clearTimeout(timer);
+          timer = setTimeout(function () {
+            self.reset(self.filter.value.trim().toLowerCase());
+          }, 150);
+        });
+      }
+      self.observe();
+    });
+  };
+
+  PostList.prototype.reset = function (query) {
+    this.generation += 1;
+    this.query = query;
+    this.next = 0;
+    this.pending = [];
+    this.loading = false;
+    this.list.innerHTML = '';
+    this.more.hidden = false;
+    this.show();
+  };
+
+  PostList.prototype.show = function () {
+    var self = this;
+    var generation = this.generation;
+    if (this.loading) {
+      return;
+    }
+    if (this.pending.length < this.batch && this.next < this.manifest.length) {
+      this.loading = true;
+      this.loadShard(this.manifest[this.next]).then(function (posts) {
+        if (generation !== self.generation) {
+          return;
+        }
+        self.next += 1;
+        self.loading = false;
+        posts.forEach(function (post) {
+          if (matchesOptions(post, self.options) &&
+              matchesQuery(post, self.query)) {
+            self.pending.push(post);
+          }
+        });
+        self.show();
+      });
+      return;
+    }
+    this.pending.splice(0, this.batch).forEach(function (post) {
+      self.list.appendChild(renderPost(post, self.base));
+    });
+    this.more.hidden = (this.pending.length === 0 &&
+                        this.next >= this.manifest.length);
+    if (this.visible && !this.more.hidden) {
+      window.requestAnimationFrame(function () {
+        self.show();
+      });
+    }
+  };
+
+  PostList.prototype.observe = function () {
+    var self = this;
+    if ('IntersectionObserver' in window) {
+      new IntersectionObserver(function (entries) {
+        self.visible = entries[0].isIntersecting;
+        if (self.visible) {
+          self.show();
+        }
+      }).observe(this.more);
+    } else {
+      this.more.addEventListener('click', function () {
+        self.show();
+      });
+    }
+  };
+
+  document.addEventListener('DOMContentLoaded', function () {
+    var elements = document.querySelectorAll('.blogpost-index');
+    Array.prototype.forEach.call(elements, function (element) {
+      new PostList(element).start();
+    });
+  });
+}());
@@ -2,49 +2,181 @@
 # Copyright (c) 2018, Anders Lervik.
 # Distributed under the LGPLv2.1+ License. See LICENSE for more info.
 """An extension for sphinx for making a blog-like web page."""
+import functools
 import os
-import jinja2
+from docutils import nodes
 from blogpost.blogpostdirective import shorten_text
+from blogpost.instrument import timed
 
 
 HERE = os.path.dirname(os.path.abspath(__file__))
 TEMPLATE_DIR = os.path.join(HERE, 'templates')
+TEMPLATE_FILES = {
+    'blogpost': {'pre': 'blogpost.html', 'post': None},
+    'blogoutput': {'pre': 'blogoutput.html', 'post': None},
+    'taglist': {'pre': 'taglist.html', 'post': None},
+    'recent': {'pre': 'recent.html', 'post': None},
+    'listing': {'pre': 'listing.html', 'post': None},
+    'pagination': {'pre': 'pagination.html', 'post': None},
+    'postindex': {'pre': 'postindex.html', 'post': None},
+}
+TEMPLATE_SETTINGS = {
+    'search_path': [TEMPLATE_DIR],
+    'cache_dir': None,
+    'environment': None,
+}
+TEMPLATES = {}
+SUMMARY_LENGTH = 100
+# The rendered summaries of the posts, split where the link to the
+# post goes. The link is the only thing that differs between the
+# pages listing a post.
+SNIPPETS = {}
+REFID_MARKER = '\x00refid\x00'
+
+
+def make_environment(search_path, cache_dir=None):
+    """Create the jinja2 environment used for loading templates.
+
+    Parameters
+    ----------
+    search_path : list of strings
+        The directories to search for templates, in order.
+    cache_dir : string, optional
+        A directory for storing compiled templates. If given,
+        the templates are only compiled when they have changed.
+
+    Returns
+    -------
+    out : object like :py:class:`jinja2.Environment`
+        The environment to load templates from.
+
+    """
+    import jinja2  # pylint: disable=import-outside-toplevel
+    bytecode_cache = None
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(cache_dir)
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(search_path),
+        bytecode_cache=bytecode_cache,
+    )
+
+
+def template_path(filename):
+    """Return the path to the template file used for a template.
+
+    Parameters
+    ----------
+    filename : string
+        The name of the template file, e.g. ``'recent.html'``.
+
+    Returns
+    -------
+    out : string
+        The first file with the name in the template search path.
+
+    """
+    for directory in TEMPLATE_SETTINGS['search_path']:
+        path = os.path.join(directory, filename)
+        if os.path.isfile(path):
+            return path
+    return os.path.join(TEMPLATE_DIR, filename)
+
+
+def get_template(name, key='pre'):
+    """Return a template, loading and compiling it on first use.
+
+    Parameters
+    ----------
+    name : string
+        The name of the template, e.g. ``'blogpost'``.
+    key : string
+        Selects the part of the template, ``'pre'`` or ``'post'``.
 
+    Returns
+    -------
+    out : object like :py:class:`jinja2.Template` or None
+        The template. None is returned if there is no template
+        for the given part.
 
-def read_template(template_file):
-    """Return a jinja2 template from a template file."""
-    if template_file is None or not os.path.isfile(template_file):
-        template = jinja2.Template('')
-    else:
-        with open(template_file, 'r') as template_raw:
-            template = jinja2.Template(template_raw.read())
+    """
+    try:
+        return TEMPLATES[(name, key)]
+    except KeyError:
+        pass
+    template_file = TEMPLATE_FILES[name][key]
+    template = None
+    if template_file is not None:
+        if TEMPLATE_SETTINGS['environment'] is None:
+            TEMPLATE_SETTINGS['environment'] = make_environment(
+                TEMPLATE_SETTINGS['search_path'],
+                cache_dir=TEMPLATE_SETTINGS['cache_dir'],
+            )
+        template = TEMPLATE_SETTINGS['environment'].get_template(
+            template_file
+        )
+    TEMPLATES[(name, key)] = template
     return template
 
 
-TEMPLATES = {
-    'blogpost': {
-        'pre': read_template(os.path.join(TEMPLATE_DIR, 'blogpost.html')),
-        'post': read_template(None),
-    },
-    'blogoutput': {
-        'pre': read_template(os.path.join(TEMPLATE_DIR, 'blogoutput.html')),
-        'post': read_template(None),
-    },
-    'taglist': {
-        'pre': read_template(os.path.join(TEMPLATE_DIR, 'taglist.html')),
-        'post': read_template(None),
-    },
-    'recent': {
-        'pre': read_template(os.path.join(TEMPLATE_DIR, 'recent.html')),
-        'post': read_template(None),
-    },
-}
+def render_template(name, key='pre', **context):
+    """Render a template with the given context.
+
+    Parameters
+    ----------
+    name : string
+        The name of the template, e.g. ``'blogpost'``.
+    key : string
+        Selects the part of the template, ``'pre'`` or ``'post'``.
+    context : dict
+        The variables passed to the template.
+
+    Returns
+    -------
+    out : string
+        The rendered template.
+
+    """
+    template = get_template(name, key=key)
+    if template is None:
+        return ''
+    return template.render(**context)
+
+
+def init_templates(app):
+    """Set up where the templates are loaded from for the current build.
+
+    The templates are first searched for in the ``templates_path``
+    of the project, so that they can be overridden, and then in
+    the templates shipped with this extension. Nothing is loaded
+    here, the templates are compiled when first rendered.
 
+    Parameters
+    ----------
+    app : object like :py:class:`sphinx.application.Sphinx`
+        The application object used.
 
+    """
+    search_path = [
+        os.path.join(app.confdir, path) for path in app.config.templates_path
+    ]
+    search_path.append(TEMPLATE_DIR)
+    TEMPLATE_SETTINGS['search_path'] = search_path
+    TEMPLATE_SETTINGS['cache_dir'] = os.path.join(
+        app.doctreedir, 'blogpost-templates'
+    )
+    TEMPLATE_SETTINGS['environment'] = None
+    TEMPLATES.clear()
+    SNIPPETS.clear()
+    short_summary.cache_clear()
+
+
+@timed('html_visit_blogpost')
 def html_visit_blogpost(self, node):
     """Add HTML code for the blog post."""
     self.body.append(
-        TEMPLATES['blogpost']['pre'].render(
+        render_template(
+            'blogpost',
             time=node['short_time'],
             long_time=node['time'],
             author=node['author'],
@@ -58,6 +190,7 @@ def html_visit_blogpost(self, node):
             next_text=node['next_text'],
             prev_node=node['prev'],
             prev_text=node['prev_text'],
+            related=node['related'],
         )
     )
 
@@ -66,19 +199,75 @@ def html_depart_blogpost(self, node):
     """Add HTML code for the blog post."""
     # pylint: disable=unused-argument
     self.body.append(
-        TEMPLATES['blogpost']['post'].render()
+        render_template('blogpost', key='post')
     )
 
 
+@functools.lru_cache(maxsize=None)
+def short_summary(summary):
+    """Return a summary shortened for the lists of posts.
+
+    The shortened summaries are cached, since each post is
+    listed on several pages.
+    """
+    return shorten_text(summary, length=SUMMARY_LENGTH)
+
+
+def render_blogoutput(title, summary, refid, time):
+    """Return HTML code for a blog summary.
+
+    The summary is rendered once for each post, and the
+    reference is then inserted for each page listing the post.
+
+    Parameters
+    ----------
+    title : string
+        The title of the post.
+    summary : string
+        The summary of the post, this is shortened here.
+    refid : string
+        The reference to the post.
+    time : object like :py:class:`datetime.datetime`
+        The time of the post.
+
+    Returns
+    -------
+    out : string
+        The rendered summary.
+
+    """
+    key = (title, summary, time)
+    try:
+        parts = SNIPPETS[key]
+    except KeyError:
+        html = render_template(
+            'blogoutput',
+            title=title,
+            summary=short_summary(summary),
+            refid=REFID_MARKER,
+            time=time,
+        )
+        # A template may modify the reference, e.g. with a filter,
+        # and then it has to be rendered for each page.
+        parts = html.split(REFID_MARKER) if REFID_MARKER in html else None
+        SNIPPETS[key] = parts
+    if parts is None:
+        return render_template(
+            'blogoutput',
+            title=title,
+            summary=short_summary(summary),
+            refid=refid,
+            time=time,
+        )
+    return refid.join(parts)
+
+
+@timed('html_visit_blogoutput')
 def html_visit_blogoutput(self, node):
     """Add HTML code for blog summaries."""
-    summary = shorten_text(node['summary'], length=100)
     self.body.append(
-        TEMPLATES['blogoutput']['pre'].render(
-            title=node['title'],
-            summary=summary,
-            refid=node['refid'],
-            time=node['time'],
+        render_blogoutput(
+            node['title'], node['summary'], node['refid'], node['time']
         )
     )
 
@@ -87,7 +276,7 @@ def html_depart_blogoutput(self, node):
     """Add HTML code for blog summaries."""
     # pylint: disable=unused-argument
     self.body.append(
-        TEMPLATES['blogoutput']['post'].render()
+        render_template('blogoutput', key='post')
     )
 
 
@@ -103,10 +292,12 @@ def html_depart_empty(self, node):
     pass
 
 
+@timed('html_visit_recent')
 def html_visit_recent(self, node):
     """Add HTML code for the recent cards."""
     self.body.append(
-        TEMPLATES['recent']['pre'].render(
+        render_template(
+            'recent',
             length=node['nmax'],
             items=node['items'],
         )
@@ -117,14 +308,16 @@ def html_depart_recent(self, node):
     """Add HTML code for the recent cards."""
     # pylint: disable=unused-argument
     self.body.append(
-        TEMPLATES['recent']['post'].render()
+        render_template('recent', key='post')
     )
 
 
+@timed('html_visit_taglist')
 def html_visit_taglist(self, node):
     """Add HTML code for the recent cards."""
     self.body.append(
-        TEMPLATES['taglist']['pre'].render(
+        render_template(
+            'taglist',
             tags=node['tags'],
             tags_and_ref=node['tags_and_ref'],
         )
@@ -135,5 +328,56 @@ def html_depart_taglist(self, node):
     """Add HTML code for the recent cards."""
     # pylint: disable=unused-argument
     self.body.append(
-        TEMPLATES['taglist']['post'].render()
+        render_template('taglist', key='post')
+    )
+
+
+@timed('html_visit_listing')
+def html_visit_listing(self, node):
+    """Add the pre-rendered HTML code for a list of posts."""
+    self.body.append(node['html'])
+    raise nodes.SkipNode
+
+
+def html_visit_pagination(self, node):
+    """Add HTML code for navigating between pages of a listing."""
+    self.body.append(
+        render_template(
+            'pagination',
+            prev_ref=node['prev_ref'],
+            next_ref=node['next_ref'],
+            number=node['number'],
+            npages=node['npages'],
+        )
+    )
+
+
+def html_depart_pagination(self, node):
+    """Add HTML code for navigating between pages of a listing."""
+    # pylint: disable=unused-argument
+    self.body.append(
+        render_template('pagination', key='post')
+    )
+
+
+@timed('html_visit_postindex')
+def html_visit_postindex(self, node):
+    """Add HTML code for a list of posts loaded from the JSON index."""
+    self.body.append(
+        render_template(
+            'postindex',
+            index_uri=node['index_uri'],
+            tag=node['tag'],
+            category=node['category'],
+            batch=node['batch'],
+            filter=node['filter'],
+        )
+    )
+
+
+def html_depart_postindex(self, node):
+    """Add HTML code for a list of posts loaded from the JSON index."""
+    # pylint: disable=unused-argument
+    self.body.append(
+        render_template('postindex', key='post')
     )
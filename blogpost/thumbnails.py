@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Methods for creating thumbnails of the summary images.
+
+The thumbnails are created with Pillow, which is optional. They are
+stored in a cache directory with names given by a hash of the
+contents of the source image and the size of the thumbnail. Images
+which have been processed before are therefore not opened again,
+the thumbnails are just copied to the output directory if needed.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import importlib.util
+import json
+import os
+import shutil
+from blogpost.fileutils import file_hash
+
+
+THUMBNAIL_DIR = 'thumbnails'
+JPEG_QUALITY = 85
+
+
+def has_pillow():
+    """Return True if Pillow can be imported."""
+    return importlib.util.find_spec('PIL') is not None
+
+
+def make_thumbnails(source, cache_dir, key, widths):
+    """Create thumbnails of an image.
+
+    This is run in the worker processes. A thumbnail is made for
+    each width smaller than the image, the images are never scaled
+    up.
+
+    Parameters
+    ----------
+    source : string
+        The path to the image.
+    cache_dir : string
+        The directory to write the thumbnails to.
+    key : string
+        The hash of the image, used for naming the thumbnails.
+    widths : list of integers
+        The maximum width (and height) of the thumbnails.
+
+    Returns
+    -------
+    out : dict
+        The `width` and `height` of the image and the `thumbs`,
+        given by their file name, width and height.
+
+    """
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+    ext = os.path.splitext(source)[1].lower()
+    with Image.open(source) as image:
+        info = {'width': image.width, 'height': image.height, 'thumbs': []}
+        for width in sorted(set(widths)):
+            if width >= max(image.width, image.height):
+                break
+            thumb = image.copy()
+            thumb.thumbnail((width, width))
+            name = '{}-{}{}'.format(key, width, ext)
+            options = {}
+            if ext in ('.jpg', '.jpeg'):
+                if thumb.mode not in ('RGB', 'L'):
+                    thumb = thumb.convert('RGB')
+                options = {'quality': JPEG_QUALITY, 'optimize': True}
+            thumb.save(os.path.join(cache_dir, name), **options)
+            info['thumbs'].append((name, thumb.width, thumb.height))
+    return info
+
+
+class ThumbnailCache:
+    """The thumbnails made for the summary images.
+
+    The information about the thumbnails is stored in ``index.json``
+    in the cache directory, keyed on the hash of the source image.
+    The hash of each source is also stored, together with its size
+    and modification time, so that unchanged images are not read.
+
+    Attributes
+    ----------
+    cache_dir : string
+        The directory storing the thumbnails.
+    widths : list of integers
+        The maximum sizes of the thumbnails to create.
+    sources : dict of dicts
+        The `size`, `mtime` and `hash` of each source image.
+    images : dict of dicts
+        For each hash, the thumbnails as given by
+        :py:func:`.make_thumbnails`.
+    created : integer
+        The number of images processed in this build.
+
+    """
+
+    def __init__(self, cache_dir, widths):
+        """Load the information about existing thumbnails.
+
+        Parameters
+        ----------
+        cache_dir : string
+            The directory storing the thumbnails.
+        widths : list of integers
+            The maximum sizes of the thumbnails to create.
+
+        """
+        self.cache_dir = cache_dir
+        self.widths = sorted(set(widths))
+        self.sources = {}
+        self.images = {}
+        self.created = 0
+        try:
+            with open(self.index_file(), encoding='utf-8') as infile:
+                data = json.load(infile)
+        except (OSError, ValueError):
+            data = {}
+        if data.get('widths') == self.widths:
+            self.sources = data.get('sources', {})
+            self.images = data.get('images', {})
+
+    def index_file(self):
+        """Return the path to the stored information."""
+        return os.path.join(self.cache_dir, 'index.json')
+
+    def key(self, source):
+        """Return the hash of a source image."""
+        stat = os.stat(source)
+        known = self.sources.get(source)
+        if (known is None or known['size'] != stat.st_size or
+                known['mtime'] != stat.st_mtime):
+            known = {
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'hash': file_hash(source),
+            }
+            self.sources[source] = known
+        return known['hash']
+
+    def update(self, sources, jobs=None):
+        """Create the missing thumbnails for the given images.
+
+        Parameters
+        ----------
+        sources : iterable of strings
+            The paths to the images.
+        jobs : integer, optional
+            The number of processes to use. If not given, one
+            process per CPU is used.
+
+        """
+        missing = {}
+        for source in sources:
+            key = self.key(source)
+            info = self.images.get(key)
+            if info is None or not all(
+                    os.path.isfile(os.path.join(self.cache_dir, thumb[0]))
+                    for thumb in info['thumbs']
+            ):
+                missing.setdefault(key, source)
+        if not missing:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tasks = [
+            (source, self.cache_dir, key, self.widths)
+            for key, source in missing.items()
+        ]
+        if len(tasks) == 1:
+            results = [make_thumbnails(*tasks[0])]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = list(pool.map(make_thumbnails, *zip(*tasks)))
+        for (_, _, key, _), info in zip(tasks, results):
+            self.images[key] = info
+        self.created += len(tasks)
+
+    def get(self, source):
+        """Return the thumbnails of an image, see :py:meth:`.update`."""
+        return self.images[self.key(source)]
+
+    def copy_to(self, source, outdir):
+        """Copy the thumbnails of an image to the output directory.
+
+        Parameters
+        ----------
+        source : string
+            The path to the image.
+        outdir : string
+            The directory to copy the thumbnails to.
+
+        Returns
+        -------
+        out : dict
+            The thumbnails, see :py:func:`.make_thumbnails`.
+
+        """
+        info = self.get(source)
+        for name, _, _ in info['thumbs']:
+            target = os.path.join(outdir, name)
+            if not os.path.isfile(target):
+                os.makedirs(outdir, exist_ok=True)
+                shutil.copyfile(os.path.join(self.cache_dir, name), target)
+        return info
+
+    def save(self):
+        """Store the information about the thumbnails."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.index_file(), 'w', encoding='utf-8') as output:
+            json.dump(
+                {
+                    'widths': self.widths,
+                    'sources': self.sources,
+                    'images': self.images,
+                },
+                output,
+            )
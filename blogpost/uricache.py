@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""A cache for relative references between documents."""
+
+
+class RelativeUriCache:
+    """Memoize the relative URIs between documents.
+
+    The listing pages and the post headers ask for the same
+    relative URIs over and over again, e.g. from the recent page
+    to the page with tags. Here, we store the URIs so that the
+    builder only computes each of them once.
+
+    Attributes
+    ----------
+    hits : integer
+        The number of look-ups answered from the cache.
+    misses : integer
+        The number of look-ups passed on to the builder.
+
+    """
+
+    def __init__(self):
+        """Set up an empty cache."""
+        self._uris = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, builder, fromdocname, todocname):
+        """Return the relative URI from one document to another.
+
+        Parameters
+        ----------
+        builder : object like :py:class:`sphinx.builders.Builder`
+            The builder used for creating the URI.
+        fromdocname : string
+            The document to create the reference from.
+        todocname : string
+            The document to create the reference to.
+
+        Returns
+        -------
+        out : string
+            The relative URI, as given by the builder.
+
+        """
+        key = (fromdocname, todocname)
+        try:
+            uri = self._uris[key]
+        except KeyError:
+            self.misses += 1
+            uri = builder.get_relative_uri(fromdocname, todocname)
+            self._uris[key] = uri
+        else:
+            self.hits += 1
+        return uri
+
+    @property
+    def hit_rate(self):
+        """Return the fraction of look-ups answered from the cache."""
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
+
+    def __len__(self):
+        """Return the number of stored URIs."""
+        return len(self._uris)
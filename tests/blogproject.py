@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""A small blog project for building in the tests."""
+import os
+from sphinx.application import Sphinx
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONF = '''
+import sys
+sys.path.insert(0, {root!r})
+project = 'test'
+extensions = ['blogpost']
+html_theme = 'alabaster'
+blog_related_posts = 2
+'''
+
+INDEX = '''
+Index
+=====
+
+.. blog-post-recent::
+   :length: 3
+
+.. blog-post-list-tags::
+
+.. toctree::
+   :glob:
+
+   posts/*
+'''
+
+LISTINGS = {
+    'archive': 'blog-post-archive',
+    'categories': 'blog-post-categories',
+    'tags': 'blog-post-tags',
+}
+
+POST = '''
+Post {number}
+=======
+
+.. blog-post::
+   :author: Someone
+   :title: Post number {number}
+   :category: {category}
+   :tags: {tags}
+   :time: {day:02d}.01.2017, 12:00:00
+   :summary: The summary of post {number}.
+
+Some text.
+'''
+
+# Files which differ between builds without affecting the pages:
+IGNORED = ('_sources', '_static', '.doctrees', '.buildinfo', 'searchindex.js')
+
+
+def write_post(srcdir, number, category='Life', tags='sphinx, python'):
+    """Write the source file of a post."""
+    path = os.path.join(srcdir, 'posts', 'post{:02d}.rst'.format(number))
+    with open(path, 'w', encoding='utf-8') as output:
+        output.write(POST.format(number=number, category=category,
+                                 tags=tags, day=number + 1))
+
+
+def create_project(srcdir, conf='', listing_options=''):
+    """Write a small blog with a few posts."""
+    os.makedirs(os.path.join(srcdir, 'posts'))
+    with open(os.path.join(srcdir, 'conf.py'), 'w') as output:
+        output.write(CONF.format(root=ROOT) + conf)
+    with open(os.path.join(srcdir, 'index.rst'), 'w') as output:
+        output.write(INDEX)
+    for name, directive in LISTINGS.items():
+        path = os.path.join(srcdir, 'posts', name + '.rst')
+        with open(path, 'w') as output:
+            output.write('{0}\n{1}\n\n.. {2}::\n{3}'.format(
+                name.title(), '=' * len(name), directive, listing_options))
+    for number in range(6):
+        write_post(srcdir, number,
+                   category=('Life', 'Work')[number % 2],
+                   tags=('sphinx, python', 'python', 'food')[number % 3])
+
+
+def build(srcdir, outdir, parallel=0, builder='html'):
+    """Build the project with the given builder."""
+    app = Sphinx(srcdir, srcdir, outdir, os.path.join(outdir, '.doctrees'),
+                 builder, status=None, warning=None, freshenv=False,
+                 parallel=parallel)
+    app.build()
+
+
+def read_pages(outdir):
+    """Return the contents of the generated pages."""
+    pages = {}
+    for dirpath, dirnames, filenames in os.walk(outdir):
+        dirnames[:] = [i for i in dirnames if i not in IGNORED]
+        for filename in filenames:
+            if filename in IGNORED:
+                continue
+            path = os.path.join(dirpath, filename)
+            with open(path, 'rb') as infile:
+                pages[os.path.relpath(path, outdir)] = infile.read()
+    return pages
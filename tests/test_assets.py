@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Test the minification of the static files and the critical CSS."""
+from blogpost.assets import critical_css, css_rules, minify_css, minify_js
+
+
+def test_minify_css():
+    """Test removing comments and white space."""
+    text = '''/* Header */
+    .a , .b > .c {
+        color : red ;
+        margin:  0;
+    }
+    '''
+    assert minify_css(text) == '.a,.b>.c{color :red;margin:0}'
+
+
+def test_comment_in_string():
+    """Test that a comment inside a string is kept."""
+    text = 'a::after { content: "/* not a comment */"; } /* comment */'
+    assert minify_css(text) == 'a::after{content:"/* not a comment */"}'
+
+
+def test_escaped_quotes():
+    """Test strings with escaped quotes."""
+    text = '''a::before { content: "say \\"hi ;}\\"" ; }
+    b::before { content: 'it\\'s  /* here */' ; }'''
+    assert minify_css(text) == (
+        'a::before{content:"say \\"hi ;}\\""}'
+        "b::before{content:'it\\'s  /* here */'}"
+    )
+
+
+def test_whitespace_in_content():
+    """Test that white space and ;} inside a string are kept."""
+    text = 'q::after { content: "  a ,  b ;} > c  " ; }'
+    assert minify_css(text) == 'q::after{content:"  a ,  b ;} > c  "}'
+    text = 'div { grid-template-areas: "a b"  "c d"; }'
+    assert minify_css(text) == 'div{grid-template-areas:"a b" "c d"}'
+
+
+def test_css_rules():
+    """Test splitting a style sheet into rules."""
+    text = minify_css('''
+    .a { content: "{"; }
+    @media (max-width: 600px) { .a { color: red; } .b { color: blue; } }
+    .b { content: "}" }
+    ''')
+    assert list(css_rules(text)) == [
+        ('.a', '.a{content:"{"}'),
+        ('@media (max-width:600px)',
+         '@media (max-width:600px){.a{color:red}.b{color:blue}}'),
+        ('.b', '.b{content:"}"}'),
+    ]
+
+
+def test_critical_css():
+    """Test selecting the rules for the classes in use."""
+    text = minify_css('''
+    .card { content: "}"; }
+    .card .title, .other { color: red; }
+    .other { color: blue; }
+    @media print { .card { display: none; } }
+    p { margin: 0; }
+    ''')
+    assert critical_css(text, {'card', 'title'}) == (
+        '.card{content:"}"}.card .title,.other{color:red}'
+    )
+
+
+def test_minify_js():
+    """Test removing the header and the indentation of a script."""
+    text = '''/* Header
+     * comment. */
+    function f() {
+        return 1;
+
+    }
+    '''
+    assert minify_js(text) == 'function f() {\nreturn 1;\n}\n'
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Test that incremental builds give the same pages as full builds."""
+import os
+import pytest
+from blogpost.blogpostdirective import unique_slugs
+from blogproject import build, create_project, read_pages, write_post
+
+
+@pytest.mark.parametrize('parallel', [0, 2])
+def test_incremental_build(tmp_path, parallel):
+    """Test editing, adding and removing posts between builds."""
+    srcdir = str(tmp_path / 'src')
+    create_project(srcdir)
+    build(srcdir, str(tmp_path / 'out'), parallel=parallel)
+    write_post(srcdir, 1, category='Travel', tags='food, python')
+    write_post(srcdir, 6, tags='sphinx')
+    os.remove(os.path.join(srcdir, 'posts', 'post03.rst'))
+    build(srcdir, str(tmp_path / 'out'), parallel=parallel)
+    build(srcdir, str(tmp_path / 'fresh'), parallel=parallel)
+    incremental = read_pages(str(tmp_path / 'out'))
+    fresh = read_pages(str(tmp_path / 'fresh'))
+    # Sphinx does not remove the page of a removed document:
+    assert set(incremental) - set(fresh) == {'posts/post03.html'}
+    for name, content in fresh.items():
+        assert incremental[name] == content, name
+    assert 'Travel' in incremental['posts/categories.html'].decode('utf-8')
+
+
+@pytest.mark.parametrize('group_pages', [False, True])
+def test_colliding_tag(tmp_path, group_pages):
+    """Test adding a tag whose slug collides with an existing tag."""
+    srcdir = str(tmp_path / 'src')
+    create_project(srcdir, conf='blog_group_pages = {}\n'.format(group_pages))
+    write_post(srcdir, 0, tags='c++, python')
+    write_post(srcdir, 3, tags='c++')
+    build(srcdir, str(tmp_path / 'out'))
+    write_post(srcdir, 5, tags='c#')
+    build(srcdir, str(tmp_path / 'out'))
+    build(srcdir, str(tmp_path / 'fresh'))
+    incremental = read_pages(str(tmp_path / 'out'))
+    fresh = read_pages(str(tmp_path / 'fresh'))
+    for name, content in fresh.items():
+        assert incremental[name] == content, name
+    slug = unique_slugs(['c++', 'c#'])['c++']
+    assert slug != 'c'
+    assert slug.encode('utf-8') in fresh['posts/post03.html']
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Test reading the database with the metadata of the posts."""
+from datetime import datetime
+import os
+import sqlite3
+import pytest
+from blogpost.blogpostdirective import BLOG_ITEMS, PostRecord
+from blogpost.metadb import PostDatabase, query_posts
+
+
+def make_post(number, tags, time):
+    """Create a post record."""
+    fields = {key: '' for key in BLOG_ITEMS}
+    fields.update(title='Post {}'.format(number), time=time,
+                  category='Life', tags=tuple(tags))
+    return PostRecord(docname='posts/post{}'.format(number),
+                      targetid='post-0', **fields)
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Write a database with three posts."""
+    path = str(tmp_path / 'posts.sqlite')
+    posts = [
+        make_post(0, ['python'], datetime(2017, 5, 1)),
+        make_post(1, ['python', 'sphinx'], datetime(2018, 3, 1)),
+        make_post(2, ['sphinx'], datetime(2018, 6, 1)),
+    ]
+    sources = {}
+    for post in posts:
+        source = tmp_path / (post.docname.replace('/', '_') + '.rst')
+        source.write_text('')
+        sources[post.docname] = str(source)
+    database = PostDatabase(path)
+    database.update(str(tmp_path), sources, posts, sources)
+    database.close()
+    return path
+
+
+def test_query_posts(database):
+    """Test filtering the posts on tag and time."""
+    posts = query_posts(database, tag='python')
+    assert [i.docname for i in posts] == ['posts/post1', 'posts/post0']
+    posts = query_posts(database, tag='sphinx', start='2018', end='2018-05')
+    assert [i.docname for i in posts] == ['posts/post1']
+    assert posts[0].tags == ('python', 'sphinx')
+
+
+def test_query_posts_readonly(database, tmp_path):
+    """Test that querying never creates or changes a database."""
+    missing = str(tmp_path / 'missing' / 'posts.sqlite')
+    with pytest.raises(sqlite3.OperationalError):
+        query_posts(missing)
+    assert not os.path.exists(os.path.dirname(missing))
+    connection = sqlite3.connect(database)
+    with connection:
+        connection.execute('PRAGMA user_version = 0')
+    connection.close()
+    with pytest.raises(ValueError):
+        query_posts(database)
+    connection = sqlite3.connect(database)
+    count = connection.execute('SELECT COUNT(*) FROM posts').fetchone()[0]
+    connection.close()
+    assert count == 3
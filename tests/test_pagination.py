@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Test the pagination of the lists of posts."""
+import os
+from blogpost.pagination import first_pages, page_name, paginate
+from blogproject import build, create_project
+
+
+PAGE_SIZE = '   :page-size: 2\n'
+GROUPS = {'a': [1, 2, 3], 'b': [4], 'c': [5, 6, 7, 8]}
+
+
+def test_paginate_single_page():
+    """Test that all groups are on one page without a page size."""
+    for page_size in (None, 0):
+        pages = paginate(GROUPS, ['c', 'a', 'b'], page_size)
+        assert pages == [[('c', [5, 6, 7, 8]), ('a', [1, 2, 3]),
+                          ('b', [4])]]
+
+
+def test_paginate_split_groups():
+    """Test that groups are continued on the next page."""
+    pages = paginate(GROUPS, ['a', 'b', 'c'], 3)
+    assert pages == [
+        [('a', [1, 2, 3])],
+        [('b', [4]), ('c', [5, 6])],
+        [('c', [7, 8])],
+    ]
+    assert first_pages(pages) == {'a': 0, 'b': 1, 'c': 1}
+    # Only the given groups are included:
+    assert paginate(GROUPS, ['b'], 3) == [[('b', [4])]]
+
+
+def test_paginate_exact_fit():
+    """Test that no empty page is added when the last page is full."""
+    pages = paginate(GROUPS, ['a', 'b'], 2)
+    assert pages == [[('a', [1, 2])], [('a', [3]), ('b', [4])]]
+
+
+def test_page_name():
+    """Test the names of the pages of a listing."""
+    assert page_name('posts/tags', 0) == 'posts/tags'
+    assert page_name('posts/tags', 1) == 'posts/tags-page-2'
+    assert page_name('posts/tags', 9) == 'posts/tags-page-10'
+
+
+def test_paginated_html(tmp_path):
+    """Test that HTML gets extra pages for a paginated listing."""
+    srcdir = str(tmp_path / 'src')
+    create_project(srcdir, listing_options=PAGE_SIZE)
+    build(srcdir, str(tmp_path / 'out'))
+    for name in ('archive', 'categories', 'tags'):
+        assert os.path.isfile(
+            str(tmp_path / 'out' / 'posts' / (name + '-page-2.html'))
+        )
+
+
+def test_not_paginated_for_other_builders(tmp_path):
+    """Test that other builders get the full, unpaginated listings."""
+    srcdir = str(tmp_path / 'src')
+    create_project(srcdir, listing_options=PAGE_SIZE)
+    build(srcdir, str(tmp_path / 'out'), builder='xml')
+    # The number of posts listed for each group, summed:
+    expected = {'archive': 6, 'categories': 6, 'tags': 8}
+    for name, count in expected.items():
+        path = tmp_path / 'out' / 'posts' / (name + '.xml')
+        text = path.read_text(encoding='utf-8')
+        assert '-page-' not in text
+        assert text.count('<BlogOutputNode') == count
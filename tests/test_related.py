@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Test finding the related posts."""
+from datetime import datetime, timedelta
+import random
+import pytest
+from blogpost.blogpostdirective import BLOG_ITEMS, PostRecord
+from blogpost.postindex import PostIndex
+from blogpost.related import (
+    SPARSE_MIN_POSTS,
+    related_posts,
+    score_python,
+    score_sparse,
+)
+
+
+def make_post(number, category, tags, time):
+    """Create a post record."""
+    fields = {key: '' for key in BLOG_ITEMS}
+    fields.update(title='Post {}'.format(number), time=time,
+                  category=category, tags=tuple(tags))
+    return PostRecord(docname='posts/post{}'.format(number),
+                      targetid='post-0', **fields)
+
+
+def random_index(npost, seed):
+    """Create an index of random posts."""
+    rng = random.Random(seed)
+    tags = ['tag{}'.format(i) for i in range(40)]
+    start = datetime(2015, 1, 1)
+    return PostIndex([
+        make_post(
+            i, 'category{}'.format(rng.randrange(6)),
+            rng.sample(tags, rng.randint(0, 4)),
+            start + timedelta(hours=rng.randrange(20000)),
+        ) for i in range(npost)
+    ])
+
+
+def test_shared_tags_only():
+    """Test that posts sharing only the category are not related."""
+    time = datetime(2018, 1, 1)
+    index = PostIndex([
+        make_post(0, 'Life', ['python'], time),
+        make_post(1, 'Life', [], time + timedelta(days=1)),
+        make_post(2, 'Work', ['python'], time + timedelta(days=2)),
+        make_post(3, 'Life', ['python'], time + timedelta(days=3)),
+    ])
+    related = related_posts(index, index.posts, 3)
+    # Post 3 is preferred since it also shares the category:
+    assert related[('posts/post0', 'post-0')] == (
+        ('posts/post3', 'post-0'), ('posts/post2', 'post-0'),
+    )
+    assert related[('posts/post1', 'post-0')] == ()
+
+
+@pytest.mark.parametrize('length', [1, 3, 8])
+def test_sparse_equals_python(length):
+    """Test that both methods give the same related posts."""
+    pytest.importorskip('scipy')
+    index = random_index(SPARSE_MIN_POSTS + 100, seed=7)
+    positions = list(range(len(index)))
+    expected = score_python(index, positions, length)
+    assert score_sparse(index, positions, length) == expected
+    assert any(len(i) == length for i in expected.values())
+
+
+def test_sparse_ties():
+    """Test that equal scores are ordered with the newest post first."""
+    pytest.importorskip('scipy')
+    time = datetime(2018, 1, 1)
+    # All posts have the same tags and category, so all scores are
+    # equal, the same number of days apart gives a known order:
+    index = PostIndex([
+        make_post(i, 'Life', ['python', 'sphinx'],
+                  time + timedelta(days=i))
+        for i in range(SPARSE_MIN_POSTS + 10)
+    ])
+    positions = list(range(len(index)))
+    expected = score_python(index, positions, 4)
+    assert score_sparse(index, positions, 4) == expected
+    assert expected[0] == [1, 2, 3, 4]
+    assert expected[2] == [0, 1, 3, 4]
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Anders Lervik.
+# Distributed under the LGPLv2.1+ License. See LICENSE for more info.
+"""Test the slugs made for the names of tags and categories."""
+import itertools
+import pytest
+from blogpost.blogpostdirective import slugify, unique_slugs
+
+
+@pytest.mark.parametrize('text, slug', [
+    ('Python', 'python'),
+    ('Sphinx extensions', 'sphinx-extensions'),
+    ('a_b--c', 'a-b-c'),
+    ('x.y', 'x-y'),
+    ('c++', 'c'),
+    ('Ærlig talt', 'ærlig-talt'),
+    ('日本語', '日本語'),
+    ('++', 'none'),
+])
+def test_slugify(text, slug):
+    """Test making slugs from single names."""
+    assert slugify(text) == slug
+
+
+def test_lone_name():
+    """Test that a name without collisions just gets its slug."""
+    assert unique_slugs(['c++']) == {'c++': 'c'}
+    assert unique_slugs(['Python', 'Sphinx']) == {
+        'Python': 'python', 'Sphinx': 'sphinx',
+    }
+
+
+def test_colliding_names():
+    """Test that colliding names get distinct slugs."""
+    slugs = unique_slugs(['c', 'c++', 'c#', 'C#'])
+    assert slugs['c'] == 'c'
+    assert len(set(slugs.values())) == 4
+    for name in ('c++', 'c#', 'C#'):
+        assert slugs[name].startswith('c-')
+
+
+def test_non_ascii_names():
+    """Test that non-ASCII letters are kept, and collisions handled."""
+    slugs = unique_slugs(['Ærlig', 'ærlig', 'Über'])
+    assert slugs['Über'] == 'über'
+    assert slugs['Ærlig'] != slugs['ærlig']
+    assert slugs['ærlig'] == 'ærlig'
+
+
+def test_order_independence():
+    """Test that the slugs do not depend on the order of the names."""
+    names = ['c', 'c++', 'c#', 'Python', 'python', 'Ærlig']
+    expected = unique_slugs(names)
+    for order in itertools.permutations(names):
+        assert unique_slugs(order) == expected
+
+
+def test_other_names_do_not_change_slug():
+    """Test that names with another slug do not change a slug."""
+    slugs = unique_slugs(['c++', 'c#'])
+    assert unique_slugs(['c++', 'c#', 'Python', 'java'])['c++'] == (
+        slugs['c++']
+    )